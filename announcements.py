@@ -0,0 +1,136 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+import config
+from storage import storage
+
+ANNOUNCEMENT_TTL_DAYS = getattr(config, "ANNOUNCEMENT_TTL_DAYS", 180)
+CACHE_SIZE = 32
+
+# Оголошення зберігаються як записи {id, text, created_at} з незмінними ID.
+# У пам'яті тримаємо лише відсортований список ID і кілька останніх переглянутих
+# записів; решта читається зі сховища на вимогу. Навіть список ID будується лише
+# при першому зверненні, щоб не сповільнювати запуск бота.
+# Економію пам'яті це дає лише з STORAGE_BACKEND = "sqlite": JSON-файл читається
+# цілком, тож JsonStorage тримає в пам'яті всі записи, а кеш лише дублює кілька з них.
+class AnnouncementStore:
+    DATASET = "announcement_records"
+    DELIVERY = "announcement_delivery"
+    ARCHIVE = "announcements_archive"
+    LEGACY = "announcements"
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._ids = None
+        self._last_id = 0
+        self.cache = OrderedDict()
+        self._migrate_legacy()
+
+    def _ensure_loaded(self):
+        if self._ids is None:
+            self._ids = sorted(int(key) for key in self.storage.keys(self.DATASET))
+            archived = [int(key) for key in self.storage.keys(self.ARCHIVE)]
+            self._last_id = max([*self._ids, *archived, 0])
+
+    @property
+    def ids(self) -> list:
+        self._ensure_loaded()
+        return self._ids
+
+    @property
+    def last_id(self) -> int:
+        self._ensure_loaded()
+        return self._last_id
+
+    def _migrate_legacy(self):
+        # Старий формат — список рядків, де кнопки посилались на позицію в списку
+        legacy = self.storage.load(self.LEGACY, [])
+        if not legacy:
+            return
+        for text in legacy:
+            self.add(text)
+        self.storage.replace(self.LEGACY, [])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, ann_id: int) -> Optional[dict]:
+        record = self.cache.get(ann_id)
+        if record is None:
+            record = self.storage.get(self.DATASET, str(ann_id))
+            if record is None:
+                return None
+            self.cache[ann_id] = record
+            if len(self.cache) > CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(ann_id)
+        return record
+
+    def latest_id(self) -> Optional[int]:
+        return self.ids[-1] if self.ids else None
+
+    def prev_id(self, ann_id: int) -> Optional[int]:
+        i = bisect_left(self.ids, ann_id)
+        return self.ids[i - 1] if i > 0 else None
+
+    def next_id(self, ann_id: int) -> Optional[int]:
+        i = bisect_right(self.ids, ann_id)
+        return self.ids[i] if i < len(self.ids) else None
+
+    def nearest_id(self, ann_id: int) -> Optional[int]:
+        if ann_id in self.cache or self.storage.get(self.DATASET, str(ann_id)) is not None:
+            return ann_id
+        return self.prev_id(ann_id) or self.next_id(ann_id)
+
+    def reload(self):
+        # Інший воркер додав або видалив оголошення — перечитуємо список ID
+        last_id = self.last_id
+        self._ids = sorted(int(key) for key in self.storage.keys(self.DATASET))
+        self._last_id = max([*self._ids, last_id])
+        self.cache.clear()
+
+    def add(self, text: str, ann_id: int = None) -> dict:
+        # ann_id передається, коли його виділяє спільний лічильник воркерів
+        ann_id = ann_id or self.last_id + 1
+        self._last_id = max(self.last_id, ann_id)
+        record = {"id": ann_id, "text": text, "created_at": datetime.now().isoformat(timespec="seconds")}
+        self.storage.put(self.DATASET, str(ann_id), record)
+        insort(self.ids, ann_id)
+        return record
+
+    def delete(self, ann_id: int) -> Optional[dict]:
+        record = self.get(ann_id)
+        if record is None:
+            return None
+        self.storage.delete(self.DATASET, str(ann_id))
+        self.ids.remove(ann_id)
+        self.cache.pop(ann_id, None)
+        return record
+
+    def record_delivery(self, ann_id: int, counts: dict):
+        self.storage.load(self.DELIVERY, {})
+        self.storage.put(self.DELIVERY, str(ann_id), {**counts, "finished_at": datetime.now().isoformat(timespec="seconds")})
+
+    def delivery(self, ann_id: int) -> Optional[dict]:
+        return self.storage.get(self.DELIVERY, str(ann_id))
+
+    def archive_expired(self, now: datetime = None) -> int:
+        cutoff = ((now or datetime.now()) - timedelta(days=ANNOUNCEMENT_TTL_DAYS)).isoformat(timespec="seconds")
+        expired = {}
+        for ann_id in self.ids:
+            record = self.get(ann_id)
+            if record["created_at"] >= cutoff:
+                break  # ID зростають разом із часом створення
+            expired[str(ann_id)] = record
+        if not expired:
+            return 0
+        self.storage.put_many(self.ARCHIVE, expired)
+        self.storage.delete_many(self.DATASET, list(expired))
+        for key in expired:
+            self.cache.pop(int(key), None)
+        del self.ids[:len(expired)]
+        return len(expired)
+
+
+announcement_store = AnnouncementStore(storage)
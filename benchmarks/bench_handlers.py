@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Прогін реальних обробників через Dispatcher без мережі:
+#   python benchmarks/bench_handlers.py --pets 10000 --subscribers 20000 --iterations 2000
+# Результат — JSON зі швидкістю та p50/p99 для кожного сценарію; його зручно зберігати
+# (--output) і порівнювати між комітами. Накладні витрати метрик — різниця між
+# прогонами з --metrics і без нього.
+
+ADMIN_ID = 1
+
+
+def install_config(storage_backend):
+    # Бенчмарк ніколи не має бачити справжній токен, тож підміняємо config повністю
+    config = types.ModuleType("config")
+    config.TOKEN = "42:BENCHMARK"
+    config.ADMIN_USER_ID = ADMIN_ID
+    config.FLOOD_TIMING = 1
+    config.STORAGE_BACKEND = storage_backend
+    sys.modules["config"] = config
+
+
+def write_dataset(data_dir, classes, pets, subscribers, announcements):
+    os.makedirs(data_dir, exist_ok=True)
+    subjects = ["Математика", "Українська мова", "Фізика", "Історія", "Англійська мова", "Хімія", "Біологія"]
+    class_keys = [f"{5 + i // 4}-{'АБВГ'[i % 4]}" for i in range(classes)]
+    schedule = {
+        class_key: {str(day): [subjects[(day + n) % len(subjects)] for n in range(7)] for day in range(5)}
+        for class_key in class_keys
+    }
+    long_ago = str(date.today() - timedelta(days=1))
+    tamagotchi = {
+        str(1000 + i): {"xp": 100 + i % 50, "alive": True, "last_fed": long_ago, "last_quiz": None, "last_daily": long_ago}
+        for i in range(pets)
+    }
+    created_at = datetime.now().isoformat(timespec="seconds")
+    records = {str(i): {"id": i, "text": f"Оголошення №{i}", "created_at": created_at} for i in range(1, announcements + 1)}
+    files = {
+        "schedule.json": schedule,
+        "menu.json": {str(day): "Борщ, каша, компот" for day in range(5)},
+        "tamagotchi.json": tamagotchi,
+        "authorized_liceychyk.json": [1000 + i for i in range(pets)],
+        "subscribers.json": [1000 + i for i in range(subscribers)],
+        "helpers.json": [],
+        "announcements.json": [],
+        "announcement_records.json": records,
+    }
+    for filename, content in files.items():
+        with open(os.path.join(data_dir, filename), "w", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False)
+    return class_keys
+
+
+def make_fake_session():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import GetMe
+
+    class FakeSession(BaseSession):
+        def __init__(self):
+            super().__init__()
+            self.requests = Counter()
+
+        async def make_request(self, bot, method, timeout=None):
+            self.requests[type(method).__name__] += 1
+            if isinstance(method, GetMe):
+                return method.__returning__.model_validate(
+                    {"id": 42, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+                )
+            chat_id = getattr(method, "chat_id", None)
+            text = getattr(method, "text", None)
+            if chat_id is not None and text is not None:
+                from aiogram.types import Message
+                return Message.model_validate(
+                    {"message_id": 1, "date": int(time.time()), "chat": {"id": int(chat_id), "type": "private"}, "text": text},
+                    context={"bot": bot},
+                )
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+
+def message_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Учень"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]} if text.startswith("/") else {}),
+        },
+    }
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Учень"},
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 42, "is_bot": True, "first_name": "bench"},
+                "text": "📢 ...",
+            },
+        },
+    }
+
+
+def inline_update(update_id, user_id, query):
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Учень"},
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(dp, bot, updates):
+    from aiogram.types import Update
+
+    parsed = [Update.model_validate(update, context={"bot": bot}) for update in updates]
+    latencies = []
+    started = time.perf_counter()
+    for update in parsed:
+        t0 = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "updates": len(parsed),
+        "throughput": len(parsed) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "max_ms": latencies[-1] * 1e3 if latencies else 0.0,
+    }
+
+
+async def bench(args, class_keys):
+    from aiogram import Bot, Dispatcher
+    from aiogram.fsm.storage.redis import RedisStorage
+    from fakeredis import FakeAsyncRedis
+
+    import bot as bot_module
+    from liceychyk import liceychyk_router
+    from middleware import ThrottlingMiddleware, GAME_POLICY
+    from broadcast import Broadcaster
+    from storage import storage
+
+    session = make_fake_session()
+    bot = Bot(token="42:BENCHMARK", session=session)
+    redis_storage = RedisStorage(redis=FakeAsyncRedis())
+    dp = Dispatcher()
+    dp["broadcaster"] = Broadcaster(bot)
+    dp.include_router(liceychyk_router)
+    dp.include_router(bot_module.router)
+    throttling = ThrottlingMiddleware(storage=redis_storage, router_policies={liceychyk_router: GAME_POLICY})
+    dp.message.middleware.register(throttling)
+    dp.callback_query.middleware.register(throttling)
+    if args.metrics:
+        import metrics
+        bot.session.middleware(metrics.ApiMetricsMiddleware())
+        dp.update.outer_middleware(metrics.UpdateMetricsMiddleware())
+        dp.message.middleware.register(metrics.HandlerMetricsMiddleware())
+        dp.callback_query.middleware.register(metrics.HandlerMetricsMiddleware())
+    storage.start()
+
+    n = args.iterations
+    latest = bot_module.announcement_store.latest_id() or 1
+    # Кожен сценарій розкидає апдейти по різних користувачах, щоб міряти обробники, а не антифлуд
+    scenarios = {
+        "schedule_today": [message_update(i, 1000 + i % args.pets, class_keys[i % len(class_keys)]) for i in range(n)],
+        "schedule_tomorrow": [message_update(i, 1000 + i % args.pets, f"{class_keys[i % len(class_keys)]} (завтра)") for i in range(n)],
+        "now": [message_update(i, 1000 + i % args.pets, f"{class_keys[i % len(class_keys)]} (зараз)") for i in range(n)],
+        "inline": [inline_update(i, 1000 + i % args.pets, f"{class_keys[i % len(class_keys)][:-1].lower()} завтра") for i in range(n)],
+        "feed": [message_update(i, 1000 + i % args.pets, "🍎") for i in range(n)],
+        "announcement_nav": [callback_update(i, 1000 + i % args.pets, f"ann_prev_{max(1, latest - i % 20)}") for i in range(n)],
+        "start": [message_update(i, 10_000_000 + i, "/start") for i in range(n)],
+    }
+    if args.scenarios:
+        scenarios = {name: updates for name, updates in scenarios.items() if name in args.scenarios}
+
+    results = {}
+    for name, updates in scenarios.items():
+        await redis_storage.redis.flushdb()
+        results[name] = await run_scenario(dp, bot, updates)
+    await storage.shutdown()
+
+    return {
+        "dataset": {
+            "classes": len(class_keys), "pets": args.pets,
+            "subscribers": args.subscribers, "announcements": args.announcements,
+            "storage": args.storage,
+        },
+        "metrics": args.metrics,
+        "iterations": n,
+        "scenarios": results,
+        "api_calls": dict(session.requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classes", type=int, default=28)
+    parser.add_argument("--pets", type=int, default=1000)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--announcements", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--scenarios", nargs="*")
+    parser.add_argument("--metrics", action="store_true", help="увімкнути метрики, щоб порівняти накладні витрати")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lyceum-bench-")
+    class_keys = write_dataset(os.path.join(workdir, "data"), args.classes, args.pets, args.subscribers, args.announcements)
+    os.chdir(workdir)
+    install_config(args.storage)
+    if args.storage == "sqlite":
+        from storage import migrate_json_to_sqlite
+        with contextlib.redirect_stdout(sys.stderr):
+            migrate_json_to_sqlite()
+
+    report = asyncio.run(bench(args, class_keys))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule import LESSON_TIMES, Timetable
+from bench_schedule import make_schedule
+
+# Хвилини, що покривають ранок, уроки, перерви й вечір
+MINUTES = list(range(7 * 60, 16 * 60, 7))
+
+
+# Так відповідь рахувалася б без індексу: розбір рядків часу й перебір уроків на кожен запит
+def at_naive(schedule_data: dict, class_key: str, weekday: int, minute: int):
+    lessons = schedule_data.get(class_key, {}).get(str(weekday), [])
+    current = following = None
+    for slot, subject in enumerate(lessons[:len(LESSON_TIMES)]):
+        start, end = (int(h) * 60 + int(m) for h, m in (part.split(":") for part in LESSON_TIMES[slot].split("–")))
+        if not subject.strip():
+            continue
+        if start <= minute < end:
+            current = (slot, subject.strip(), "")
+        elif start > minute and following is None:
+            following = (slot, subject.strip(), "")
+    return current, following
+
+
+def main():
+    schedule_data = make_schedule()
+    compiled = Timetable.from_schedule(schedule_data)
+    class_key = "10-А"
+    for weekday in range(5):
+        for minute in MINUTES:
+            assert at_naive(schedule_data, class_key, weekday, minute) == compiled.at(class_key, weekday, minute)
+
+    number = 2_000
+    before = min(timeit.repeat(
+        lambda: [at_naive(schedule_data, class_key, 2, minute) for minute in MINUTES], number=number, repeat=5
+    ))
+    after = min(timeit.repeat(
+        lambda: [compiled.at(class_key, 2, minute) for minute in MINUTES], number=number, repeat=5
+    ))
+    calls = number * len(MINUTES)
+
+    print(f"класів: {len(schedule_data)}, запитів: {calls}")
+    print(f"без індексу: {before / calls * 1e6:.2f} мкс/запит")
+    print(f"з індексом:  {after / calls * 1e6:.2f} мкс/запит ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
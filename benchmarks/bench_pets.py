@@ -0,0 +1,101 @@
+import os
+import sys
+import gc
+import timeit
+import argparse
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pets import Pet
+
+# Пам'ять і швидкість записів Ліцейчиків: словники з ISO-датами під рядковими ID
+# (як було) проти Pet зі __slots__ і порядковими днями під цілими ID.
+#   python benchmarks/bench_pets.py --pets 100000
+
+
+def make_records(count: int) -> dict:
+    today = date.today()
+    return {
+        str(1000 + i): {
+            "xp": 100 + i % 50, "alive": i % 7 != 0,
+            "last_fed": str(today - timedelta(days=i % 5)), "last_quiz": None,
+            "last_daily": str(today - timedelta(days=i % 3)),
+            **({"died_at": str(today - timedelta(days=i % 4))} if i % 7 == 0 else {}),
+        }
+        for i in range(count)
+    }
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    data = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, size
+
+
+# Так працювали обробники до Pet: str(date.today()) і розбір ISO-рядків на кожен запит
+def legacy_fed_today(records, uid):
+    return records[str(uid)]["last_fed"] == str(date.today())
+
+def legacy_can_revive(data):
+    if data.get("alive", True) or not data.get("died_at"):
+        return False
+    return (date.today() - date.fromisoformat(data["died_at"])).days >= 2
+
+def legacy_sweep(records, today):
+    cutoff = str(today - timedelta(days=3))
+    return sum(1 for data in records.values() if data["alive"] and data["last_fed"] <= cutoff)
+
+def pet_fed_today(pets, uid):
+    return pets[uid].last_fed == date.today().toordinal()
+
+def pet_can_revive(pet):
+    if pet.alive or pet.died_at is None:
+        return False
+    return date.today().toordinal() - pet.died_at >= 2
+
+def pet_sweep(pets, today):
+    cutoff = today.toordinal() - 3
+    return sum(1 for pet in pets.values() if pet.alive and pet.last_fed <= cutoff)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pets", type=int, default=100_000)
+    args = parser.parse_args()
+
+    raw = make_records(args.pets)
+    legacy, legacy_bytes = measure_memory(lambda: make_records(args.pets))
+    pets, pet_bytes = measure_memory(lambda: {int(uid): Pet.from_dict(data) for uid, data in raw.items()})
+    assert all(pets[int(uid)].to_dict() == data for uid, data in raw.items())
+
+    today = date.today()
+    uid = 1000 + args.pets // 2
+    dead = [data for data in legacy.values() if not data["alive"]]
+    dead_pets = [pet for pet in pets.values() if not pet.alive]
+    assert legacy_sweep(legacy, today) == pet_sweep(pets, today)
+
+    def best(fn, number):
+        return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+    rows = [
+        ("перевірка годування", best(lambda: legacy_fed_today(legacy, uid), 100_000), best(lambda: pet_fed_today(pets, uid), 100_000)),
+        ("can_revive (мертві)", best(lambda: [legacy_can_revive(d) for d in dead], 10) / len(dead),
+         best(lambda: [pet_can_revive(p) for p in dead_pets], 10) / len(dead_pets)),
+        ("прохід голоду", best(lambda: legacy_sweep(legacy, today), 5), best(lambda: pet_sweep(pets, today), 5)),
+    ]
+    to_json = best(lambda: [pet.to_dict() for pet in pets.values()], 1)
+    from_json = best(lambda: [Pet.from_dict(data) for data in raw.values()], 1)
+
+    print(f"Ліцейчиків: {args.pets}")
+    print(f"пам'ять: dict {legacy_bytes / 2**20:.1f} МБ, Pet {pet_bytes / 2**20:.1f} МБ ({legacy_bytes / pet_bytes:.1f}x)")
+    for name, before, after in rows:
+        print(f"{name}: {before * 1e6:.2f} мкс -> {after * 1e6:.2f} мкс ({before / after:.1f}x)")
+    print(f"серіалізація у JSON-формат: {to_json * 1e3:.0f} мс, розбір: {from_json * 1e3:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schedule import WEEKDAY_NAMES, LESSON_TIMES, Timetable
+
+SUBJECTS = ["Математика ", "Українська мова", " Фізика", "Історія", "Англійська мова", "Хімія", "Біологія", "Фізкультура"]
+
+
+def make_schedule(classes: int = 40) -> dict:
+    return {
+        f"{grade}-{letter}": {
+            str(day): [SUBJECTS[(day + i) % len(SUBJECTS)] for i in range(7)]
+            for day in range(5)
+        }
+        for grade in range(5, 12)
+        for letter in "АБВГДЕЖ"[:max(1, classes // 7)]
+    }
+
+# Так текст будувався до кешування — на кожен запит заново
+def render_uncached(schedule_data: dict, class_key: str, target_date: date) -> str:
+    weekday = target_date.weekday()
+    lessons = schedule_data.get(class_key, {}).get(str(weekday), [])
+    day_name = WEEKDAY_NAMES[weekday].capitalize()
+    date_str = target_date.strftime("%d.%m.%Y")
+    text = f"📅 Розклад для {class_key} на {day_name} ({date_str}):\n\n"
+    for i, subject in enumerate(lessons):
+        time_slot = LESSON_TIMES[i] if i < len(LESSON_TIMES) else "???"
+        text += f"{i+1}. {time_slot} — {subject.strip()}\n"
+    return text
+
+
+def main():
+    schedule_data = make_schedule()
+    compiled = Timetable.from_schedule(schedule_data)
+    target_date = date(2025, 9, 1)
+    class_key = "10-А"
+    assert render_uncached(schedule_data, class_key, target_date) == compiled.render(class_key, target_date)
+
+    number = 100_000
+    before = min(timeit.repeat(lambda: render_uncached(schedule_data, class_key, target_date), number=number, repeat=5))
+    after = min(timeit.repeat(lambda: compiled.render(class_key, target_date), number=number, repeat=5))
+    compile_time = min(timeit.repeat(lambda: Timetable.from_schedule(schedule_data), number=10, repeat=3)) / 10
+
+    print(f"класів: {len(schedule_data)}, компіляція: {compile_time * 1e3:.2f} мс")
+    print(f"без кешу:  {before / number * 1e6:.2f} мкс/запит")
+    print(f"з кешем:   {after / number * 1e6:.2f} мкс/запит ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Час від запуску процесу до обробленого першого апдейта, з JSON-файлами і зі знімком:
+#   python benchmarks/bench_startup.py --pets 100000 --subscribers 200000
+# Кожен замір — окремий процес, щоб імпорти й кеші не переходили між прогонами.
+# Імпорт aiogram від даних не залежить, тож його час показано окремо від bot_import_s.
+
+from bench_handlers import install_config, write_dataset, make_fake_session, message_update, ADMIN_ID
+
+
+async def first_update(started):
+    from aiogram import Bot, Dispatcher
+    from aiogram.types import Update
+    framework = time.perf_counter() - started
+
+    import bot as bot_module
+    from liceychyk import liceychyk_router
+    from broadcast import Broadcaster
+    imported = time.perf_counter() - started - framework
+
+    bot = Bot(token="42:BENCHMARK", session=make_fake_session())
+    dp = Dispatcher()
+    dp["broadcaster"] = Broadcaster(bot)
+    dp.include_router(liceychyk_router)
+    dp.include_router(bot_module.router)
+    update = Update.model_validate(message_update(1, ADMIN_ID, "🧸 Мій Ліцейчик"), context={"bot": bot})
+    await dp.feed_update(bot, update)
+    return framework, imported, time.perf_counter() - started
+
+
+def child(args):
+    started = time.perf_counter()
+    install_config("json")
+    framework, imported, total = asyncio.run(first_update(started))
+    if args.write_snapshot:
+        from storage import storage
+        storage.write_snapshot()
+    print(json.dumps({"aiogram_import_s": framework, "bot_import_s": imported, "first_update_s": total}))
+
+
+def measure(workdir, repeat, write_snapshot=False):
+    results = []
+    for _ in range(repeat):
+        command = [sys.executable, os.path.abspath(__file__), "--child"]
+        if write_snapshot:
+            command.append("--write-snapshot")
+        output = subprocess.run(command, cwd=workdir, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: min(result[key] for result in results) for key in results[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classes", type=int, default=28)
+    parser.add_argument("--pets", type=int, default=100000)
+    parser.add_argument("--subscribers", type=int, default=200000)
+    parser.add_argument("--announcements", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--write-snapshot", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    workdir = tempfile.mkdtemp(prefix="lyceum-startup-")
+    write_dataset(os.path.join(workdir, "data"), args.classes, args.pets, args.subscribers, args.announcements)
+    json_result = measure(workdir, args.repeat)
+    # Перший прогін зі знімком лише записує його, як це зробила б зупинка бота
+    measure(workdir, 1, write_snapshot=True)
+    snapshot_result = measure(workdir, args.repeat)
+
+    report = {
+        "dataset": {"pets": args.pets, "subscribers": args.subscribers, "announcements": args.announcements},
+        "json": json_result,
+        "snapshot": snapshot_result,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_handlers import install_config
+
+# Бенчмарк не має залежати від справжнього config.py, тож підміняємо його до імпорту middleware
+install_config("json")
+
+from middleware import ThrottlingMiddleware
+from config import FLOOD_TIMING
+
+# Запуск: python benchmarks/bench_throttling.py [--redis redis://localhost:6379/15]
+# Без --redis використовується fakeredis (потрібен пакет lupa для Lua-скриптів).
+
+
+class LegacyThrottlingMiddleware:
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def __call__(self, handler, event, data):
+        user = f'user{event.from_user.id}'
+        check_user = await self.storage.redis.get(name=user)
+        if check_user:
+            if int(check_user.decode()) == 1:
+                await self.storage.redis.set(name=user, value=0, ex=10)
+                return await event.answer('Не флуди. Почекай 10 секунд')
+            return
+        await self.storage.redis.set(name=user, value=1, ex=FLOOD_TIMING)
+        return await handler(event, data)
+
+
+class CountingRedis:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = 0
+
+    def register_script(self, script):
+        from redis.commands.core import AsyncScript
+        return AsyncScript(self, script)
+
+    def __getattr__(self, name):
+        attr = getattr(self.redis, name)
+        if name in ("get", "set", "evalsha", "eval"):
+            async def counted(*args, **kwargs):
+                self.calls += 1
+                return await attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+def make_event(user_id):
+    async def answer(text):
+        return None
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id), answer=answer)
+
+
+async def handler(event, data):
+    return True
+
+
+async def run(middleware, redis, users, messages_per_user):
+    await redis.redis.flushdb()
+    redis.calls = 0
+    events = [make_event(user_id) for user_id in range(users)]
+    started = time.perf_counter()
+    for _ in range(messages_per_user):
+        for event in events:
+            await middleware(handler, event, {})
+    elapsed = time.perf_counter() - started
+    total = users * messages_per_user
+    return total / elapsed, redis.calls / total
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis", default=None)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.redis:
+        from redis.asyncio import Redis
+        client = Redis.from_url(args.redis)
+    else:
+        from fakeredis import FakeAsyncRedis
+        client = FakeAsyncRedis()
+    redis = CountingRedis(client)
+    storage = SimpleNamespace(redis=redis)
+
+    variants = {
+        "GET+SET (старий)": LegacyThrottlingMiddleware(storage),
+        "Lua": ThrottlingMiddleware(storage, local_cache_size=0),
+        "Lua + локальний кеш": ThrottlingMiddleware(storage),
+    }
+    for name, middleware in variants.items():
+        throughput, calls = await run(middleware, redis, args.users, args.messages)
+        print(f"{name:22} {throughput:10.0f} повідомлень/с, {calls:.2f} запитів до Redis на повідомлення")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
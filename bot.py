@@ -1,76 +1,66 @@
 import os
-import json
-from datetime import date, timedelta
+import asyncio
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial, lru_cache
+from typing import Optional
+from datetime import date, datetime, time, timedelta
 from aiogram import Bot, Dispatcher, Router
 from aiogram.types import (
-    Message, CallbackQuery,
+    Message, CallbackQuery, InlineQuery,
     ReplyKeyboardMarkup, KeyboardButton,
-    InlineKeyboardMarkup, InlineKeyboardButton
+    InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
 )
 from aiogram.filters import Command
-from config import TOKEN, ADMIN_USER_ID
-from middleware import ThrottlingMiddleware
+import config
+from config import TOKEN
+from middleware import (
+    ThrottlingMiddleware, ConcurrencyLimitMiddleware,
+    CHEAP_POLICY, HEAVY_POLICY, NAV_POLICY, GAME_POLICY
+)
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiogram.fsm.storage.redis import RedisStorage
-from liceychyk import liceychyk_router
+from liceychyk import liceychyk_router, sweep_hunger
+from broadcast import Broadcaster, BroadcastJobStore, BroadcastStats, JOB_LEASE, format_stats
+from storage import DATA_DIR, storage, load_json
+from registry import registry
+import state
+from announcements import announcement_store
+from leaderboard import leaderboard
+from edit_cache import edit_cache
+from schedule import WEEKDAY_NAMES, Timetable
+from reloader import FileWatcher
+import jobs
+import metrics
 # from liceychyk import handle_liceychyk
 import logging
 logging.basicConfig(level=logging.INFO)
 
-DATA_DIR = "data"
+WEBHOOK_MODE = getattr(config, "WEBHOOK_MODE", False)
+WEBHOOK_URL = getattr(config, "WEBHOOK_URL", None)  # публічна адреса; без неї вебхук не реєструється (локальні тести)
+WEBHOOK_PATH = getattr(config, "WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = getattr(config, "WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = getattr(config, "WEBHOOK_PORT", 8080)
+WEBHOOK_SECRET = getattr(config, "WEBHOOK_SECRET", None)  # обов'язковий у режимі вебхука
+MAX_CONCURRENT_UPDATES = getattr(config, "MAX_CONCURRENT_UPDATES", 64)
+METRICS_ENABLED = getattr(config, "METRICS_ENABLED", True)
+SCHEDULE_PUSH_TIME = time.fromisoformat(getattr(config, "SCHEDULE_PUSH_TIME", "19:00"))
+INLINE_CACHE_TIME = getattr(config, "INLINE_CACHE_TIME", 300)  # скільки секунд Telegram сам відповідає на повтори запиту
+
 SCHEDULE_FILE = os.path.join(DATA_DIR, "schedule.json")
+TIMETABLE_FILE = os.path.join(DATA_DIR, "timetable.json")  # результат python schedule.py import
 MENU_FILE = os.path.join(DATA_DIR, "menu.json")
-ANNOUNCEMENTS_FILE = os.path.join(DATA_DIR, "announcements.json")
-HELPERS_FILE = os.path.join(DATA_DIR, "helpers.json")
-SUBSCRIBERS_FILE = os.path.join(DATA_DIR, "subscribers.json")
 
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def load_json(path, default):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    else:
-        save_json(path, default)
-        return default
-
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-        
-schedule_data = load_json(SCHEDULE_FILE, {})
 menu_data = load_json(MENU_FILE, {})
-announcements = load_json(ANNOUNCEMENTS_FILE, [])
-helpers = load_json(HELPERS_FILE, [])
-subscribers = load_json(SUBSCRIBERS_FILE, [])
-classes_list = sorted(schedule_data.keys())
-
-WEEKDAY_NAMES = ["понеділок", "вівторок", "середа", "четвер", "п’ятниця"]
-LESSON_TIMES = [
-    "8:00–8:45", "9:00–9:45", "10:00–10:45", "11:00–11:45",
-    "12:00–12:45", "13:00–13:45", "13:50–14:35", "14:50–15:35"
-]
-
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def load_json(path, default):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    else:
-        save_json(path, default)
-        return default
-
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-pending_announcements = {}
+class_subscriptions = storage.load("class_subscriptions", {})
 
 main_kb = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="📅 Розклад"), KeyboardButton(text="📅 Завтра")],
         [KeyboardButton(text="🍲 Меню"), KeyboardButton(text="🧸 Мій Ліцейчик")],
-        [KeyboardButton(text="📢 Оголошення")]
+        [KeyboardButton(text="📢 Оголошення"), KeyboardButton(text="🕒 Зараз")]
     ],
     resize_keyboard=True
 )
@@ -88,11 +78,39 @@ def make_rows(items, suffix=""):
         rows.append(row)
     return rows
 
-class_buttons_today = make_rows(classes_list, suffix="")
-class_buttons_tomorrow = make_rows(classes_list, suffix=" (завтра)")
-
-classes_kb_today = ReplyKeyboardMarkup(keyboard=class_buttons_today, resize_keyboard=True, one_time_keyboard=True)
-classes_kb_tomorrow = ReplyKeyboardMarkup(keyboard=class_buttons_tomorrow, resize_keyboard=True, one_time_keyboard=True)
+def apply_timetable(new_timetable: Timetable):
+    global timetable, classes_list, classes_search, classes_kb_today, classes_kb_tomorrow, classes_kb_now, text_routes
+    # Спершу будуємо все похідне, а потім підміняємо разом — обробники не побачать змішаного стану
+    new_classes = list(new_timetable.classes)
+    new_kb_today = ReplyKeyboardMarkup(keyboard=make_rows(new_classes, suffix=""), resize_keyboard=True, one_time_keyboard=True)
+    new_kb_tomorrow = ReplyKeyboardMarkup(keyboard=make_rows(new_classes, suffix=" (завтра)"), resize_keyboard=True, one_time_keyboard=True)
+    new_kb_now = ReplyKeyboardMarkup(keyboard=make_rows(new_classes, suffix=" (зараз)"), resize_keyboard=True, one_time_keyboard=True)
+    new_routes = build_text_routes(new_classes)
+    new_search = sorted((class_key.casefold(), class_key) for class_key in new_classes)
+    timetable, classes_list, classes_search = new_timetable, new_classes, new_search
+    inline_cache.clear()
+    classes_kb_today, classes_kb_tomorrow, classes_kb_now, text_routes = new_kb_today, new_kb_tomorrow, new_kb_now, new_routes
+
+def apply_compiled_timetable(data):
+    apply_timetable(Timetable.from_dict(data))
+
+def apply_schedule(data):
+    # Старий schedule.json діє, лише поки не імпортовано timetable.json
+    if os.path.exists(TIMETABLE_FILE):
+        raise ValueError(f"використовується {TIMETABLE_FILE}, зміни в schedule.json ігноруються")
+    apply_timetable(Timetable.from_schedule(data))
+
+def apply_menu(data):
+    global menu_data
+    if not isinstance(data, dict):
+        raise ValueError("меню має бути об'єктом {день: текст}")
+    menu_data = data
+    inline_cache.clear()
+
+watcher = FileWatcher()
+metrics_runner = None
+inline_cache = {}
+inline_cache_date = None
 
 async def show_schedule_for_class(message: Message, class_key: str, tomorrow=False):
     today = date.today()
@@ -104,36 +122,95 @@ async def show_schedule_for_class(message: Message, class_key: str, tomorrow=Fal
         await message.answer(text)
         return
 
-    lessons = schedule_data.get(class_key, {}).get(str(weekday), [])
-    if not lessons:
-        day_name = WEEKDAY_NAMES[weekday].capitalize()
+    text = timetable.render(class_key, target_date)
+    if text is None:
         prefix = "Завтра" if tomorrow else "Сьогодні"
-        await message.answer(f"{prefix} ({day_name.lower()}) у класу {class_key} немає уроків.")
+        await message.answer(f"{prefix} ({WEEKDAY_NAMES[weekday]}) у класу {class_key} немає уроків.")
         return
 
-    day_name = WEEKDAY_NAMES[weekday].capitalize()
-    date_str = target_date.strftime("%d.%m.%Y")
-    prefix = "завтра" if tomorrow else "сьогодні"
-    text = f"📅 Розклад для {class_key} на {day_name} ({date_str}):\n\n"
-    for i, subject in enumerate(lessons):
-        time_slot = LESSON_TIMES[i] if i < len(LESSON_TIMES) else "???"
-        text += f"{i+1}. {time_slot} — {subject.strip()}\n"
+    await message.answer(text, reply_markup=main_kb)
 
+async def show_now_for_class(message: Message, class_key: str):
+    now = datetime.now()
+    if now.weekday() > 4:
+        await message.answer("Сьогодні вихідний! Уроків немає.", reply_markup=main_kb)
+        return
+    text = timetable.render_now(class_key, now.weekday(), now.hour * 60 + now.minute)
+    if text is None:
+        text = f"Сьогодні ({WEEKDAY_NAMES[now.weekday()]}) у класу {class_key} немає уроків."
     await message.answer(text, reply_markup=main_kb)
 
+async def show_now(message: Message):
+    # Клас із підписки на розклад, інакше — вибір класу
+    class_key = class_subscriptions.get(str(message.from_user.id))
+    if class_key in timetable:
+        await show_now_for_class(message, class_key)
+    elif classes_list:
+        await message.answer("Оберіть клас:", reply_markup=classes_kb_now)
+    else:
+        await message.answer("Розклад ще не додано.")
+
+# Розклад на завтра рендериться один раз на клас і розсилається всім підписникам класу
+async def push_tomorrow_schedules(broadcaster: Broadcaster):
+    target_date = date.today() + timedelta(days=1)
+    if target_date.weekday() > 4:
+        return
+    by_class = defaultdict(list)
+    for uid, class_key in class_subscriptions.items():
+        by_class[class_key].append(int(uid))
+    for class_key, chat_ids in by_class.items():
+        text = timetable.render(class_key, target_date)
+        if text is None:
+            continue
+        stats = await broadcaster.run(chat_ids, text)
+        logging.info("Розклад %s на завтра: надіслано %s, помилок %s", class_key, stats.sent, stats.failed)
+
 
 
 router = Router()
 
-@router.message(Command("start"))
+@router.message(Command("start"), flags={"throttling": CHEAP_POLICY})
 async def cmd_start(message: Message):
     user_id = message.from_user.id
-    if user_id not in subscribers:
-        subscribers.append(user_id)
-        save_json(SUBSCRIBERS_FILE, subscribers)
+    await registry.subscribe(user_id)
     await message.answer("👋 Вітаю у шкільному боті!", reply_markup=main_kb)
 
-@router.message(Command("menu"))
+@router.message(Command("subscribe"))
+async def cmd_subscribe(message: Message):
+    parts = message.text.split(maxsplit=1)
+    class_key = parts[1].strip() if len(parts) > 1 else ""
+    if class_key not in timetable:
+        classes = ", ".join(classes_list) or "класів ще немає"
+        await message.answer(f"Вкажіть клас. Приклад:\n/subscribe 10-А\n\nДоступні класи: {classes}")
+        return
+    storage.put("class_subscriptions", str(message.from_user.id), class_key)
+    leaderboard.set_class(message.from_user.id, class_key)
+    await state.events.publish("class_subscriptions", str(message.from_user.id))
+    await message.answer(f"✅ Щодня о {SCHEDULE_PUSH_TIME:%H:%M} надсилатиму розклад {class_key} на завтра.")
+
+@router.message(Command("unsubscribe"))
+async def cmd_unsubscribe(message: Message):
+    uid = str(message.from_user.id)
+    if uid not in class_subscriptions:
+        await message.answer("Ви не підписані на розклад.")
+        return
+    storage.delete("class_subscriptions", uid)
+    leaderboard.set_class(message.from_user.id, None)
+    await state.events.publish("class_subscriptions", uid)
+    await message.answer("🔕 Підписку на розклад скасовано.")
+
+@router.message(Command("now"), flags={"throttling": CHEAP_POLICY})
+async def cmd_now(message: Message):
+    parts = message.text.split(maxsplit=1)
+    class_key = parts[1].strip() if len(parts) > 1 else ""
+    if not class_key:
+        await show_now(message)
+    elif class_key in timetable:
+        await show_now_for_class(message, class_key)
+    else:
+        await message.answer(f"Класу {class_key} немає в розкладі. Приклад:\n/now 10-А")
+
+@router.message(Command("menu"), flags={"throttling": CHEAP_POLICY})
 async def cmd_menu(message: Message):
     today_weekday = date.today().weekday()
     if today_weekday > 4:
@@ -142,9 +219,87 @@ async def cmd_menu(message: Message):
     menu = menu_data.get(str(today_weekday))
     await message.answer(menu or "Меню на сьогодні ще не додано.")
 
+# Інлайн-режим: «@бот 10-А завтра», «@бот меню». Готові статті лежать у кеші за
+# (клас, дата), а cache_time і is_personal=False дають Telegram відповідати на
+# повтори того самого запиту без звернення до бота.
+INLINE_LIMIT = 50  # більше результатів Telegram не приймає
+INLINE_KEYWORDS = {"сьогодні": False, "завтра": True}
+
+def find_classes(prefix: str, limit: int):
+    # classes_search відсортований, тож усі класи з префіксом ідуть підряд
+    found = []
+    i = bisect_left(classes_search, (prefix,))
+    while i < len(classes_search) and len(found) < limit and classes_search[i][0].startswith(prefix):
+        found.append(classes_search[i][1])
+        i += 1
+    return found
+
+def cached_article(key, build) -> InlineQueryResultArticle:
+    global inline_cache_date
+    today = date.today()
+    if inline_cache_date != today:
+        inline_cache.clear()
+        inline_cache_date = today
+    article = inline_cache.get(key)
+    if article is None:
+        article = inline_cache[key] = build()
+    return article
+
+def build_schedule_article(class_key: str, target_date: date, tomorrow: bool) -> InlineQueryResultArticle:
+    weekday = target_date.weekday()
+    prefix = "Завтра" if tomorrow else "Сьогодні"
+    text = timetable.render(class_key, target_date) if weekday <= 4 else None
+    if text is not None:
+        description = f"{WEEKDAY_NAMES[weekday]}, {target_date:%d.%m}"
+    elif weekday > 4:
+        description = text = f"{prefix} вихідний! Розкладу немає."
+    else:
+        description = text = f"{prefix} ({WEEKDAY_NAMES[weekday]}) у класу {class_key} немає уроків."
+    return InlineQueryResultArticle(
+        id=f"schedule:{class_key}:{target_date.toordinal()}",
+        title=f"📅 {class_key} — {prefix.lower()}",
+        description=description,
+        input_message_content=InputTextMessageContent(message_text=text),
+    )
+
+def build_menu_article(target_date: date, tomorrow: bool) -> InlineQueryResultArticle:
+    weekday = target_date.weekday()
+    when = "завтра" if tomorrow else "сьогодні"
+    if weekday > 4:
+        text = f"{when.capitalize()} вихідний — меню немає."
+    else:
+        menu = menu_data.get(str(weekday))
+        text = f"🍲 Меню на {when} ({WEEKDAY_NAMES[weekday]}):\n\n{menu}" if menu else f"Меню на {when} ще не додано."
+    return InlineQueryResultArticle(
+        id=f"menu:{target_date.toordinal()}",
+        title=f"🍲 Меню на {when}",
+        description=text if len(text) <= 80 else text[:80] + "…",
+        input_message_content=InputTextMessageContent(message_text=text),
+    )
+
+@router.inline_query()
+async def inline_lookup(inline_query: InlineQuery):
+    words = inline_query.query.casefold().split()
+    tomorrow = any(INLINE_KEYWORDS.get(word, False) for word in words)
+    target_date = date.today() + timedelta(days=1) if tomorrow else date.today()
+    wants_menu = "меню" in words
+    prefix = " ".join(word for word in words if word not in INLINE_KEYWORDS and word != "меню")
+    results = []
+    if wants_menu:
+        results.append(cached_article(("menu", target_date), partial(build_menu_article, target_date, tomorrow)))
+    if prefix or not wants_menu:
+        for class_key in find_classes(prefix, INLINE_LIMIT - len(results)):
+            results.append(cached_article(
+                (class_key, target_date), partial(build_schedule_article, class_key, target_date, tomorrow)
+            ))
+    # Відповідь не залежить від користувача; після півночі «сьогодні» означає вже інший день
+    midnight = datetime.combine(date.today() + timedelta(days=1), time())
+    cache_time = max(1, min(INLINE_CACHE_TIME, int((midnight - datetime.now()).total_seconds())))
+    await inline_query.answer(results, cache_time=cache_time, is_personal=False)
+
 @router.message(Command("addhelper"))
 async def cmd_add_helper(message: Message):
-    if message.from_user.id != ADMIN_USER_ID:
+    if not registry.is_admin(message.from_user.id):
         await message.answer("❌ У вас немає прав для цієї команди.")
         return
     parts = message.text.split()
@@ -156,33 +311,40 @@ async def cmd_add_helper(message: Message):
     except ValueError:
         await message.answer("Невірний ID.")
         return
-    if user_id not in helpers:
-        helpers.append(user_id)
-        save_json(HELPERS_FILE, helpers)
+    if await registry.add_helper(user_id):
         await message.answer("✅ Користувача додано до помічників.")
     else:
         await message.answer("🔹 Цей користувач уже є помічником.")
 
-def get_announcement_kb(index: int, user_id: int):
+# Клавіатура повністю визначається сусідніми ID і роллю, тож однакові екземпляри
+# перевикористовуються між кліками і порівнюються в edit_cache без зайвої роботи
+@lru_cache(maxsize=1024)
+def build_announcement_kb(ann_id: int, prev_id: Optional[int], next_id: Optional[int], staff: bool):
     rows = []
-    n = len(announcements)
-    if n > 1:
-        nav = []
-        if index > 0:
-            nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"ann_prev_{index-1}"))
-        if index < n - 1:
-            nav.append(InlineKeyboardButton(text="➡️", callback_data=f"ann_next_{index+1}"))
-        if nav:
-            rows.append(nav)
-    if user_id in ([ADMIN_USER_ID] + helpers):
-        rows.append([InlineKeyboardButton(text="🗑 Видалити", callback_data=f"ann_del_{index}")])
+    nav = []
+    if prev_id is not None:
+        nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"ann_prev_{prev_id}"))
+    if next_id is not None:
+        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"ann_next_{next_id}"))
+    if nav:
+        rows.append(nav)
+    if staff:
+        rows.append([InlineKeyboardButton(text="🗑 Видалити", callback_data=f"ann_del_{ann_id}")])
     if not rows:
         return None
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-@router.message(Command("announce"))
+def get_announcement_kb(ann_id: int, user_id: int):
+    return build_announcement_kb(
+        ann_id, announcement_store.prev_id(ann_id), announcement_store.next_id(ann_id), registry.is_staff(user_id)
+    )
+
+def announcement_text(ann_id: int) -> str:
+    return f"📢 {announcement_store.get(ann_id)['text']}"
+
+@router.message(Command("announce"), flags={"throttling": HEAVY_POLICY})
 async def cmd_announce(message: Message):
-    if message.from_user.id not in ([ADMIN_USER_ID] + helpers):
+    if not registry.is_staff(message.from_user.id):
         await message.answer("❌ У вас немає прав для цієї команди.")
         return
     parts = message.text.split(maxsplit=1)
@@ -193,7 +355,7 @@ async def cmd_announce(message: Message):
     if not text:
         await message.answer("Порожнє оголошення неможливе.")
         return
-    pending_announcements[message.from_user.id] = text
+    await state.pending.set(message.from_user.id, text)
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="✅ Підтвердити", callback_data="confirm_announce"),
@@ -203,117 +365,239 @@ async def cmd_announce(message: Message):
     await message.answer(f"Підтвердити надсилання оголошення:\n\n{text}", reply_markup=kb)
 
 @router.callback_query(lambda c: c.data in ["confirm_announce", "cancel_announce"])
-async def confirm_or_cancel_announcement(callback: CallbackQuery):
+async def confirm_or_cancel_announcement(callback: CallbackQuery, broadcaster: Broadcaster):
     user_id = callback.from_user.id
     if callback.data == "cancel_announce":
-        pending_announcements.pop(user_id, None)
-        try: await callback.message.edit_text("❌ Оголошення скасовано.")
-        except: pass
+        await state.pending.pop(user_id)
+        await edit_cache.edit(callback.message, "❌ Оголошення скасовано.")
         await callback.answer()
         return
-    text = pending_announcements.pop(user_id, None)
+    text = await state.pending.pop(user_id)
     if not text:
         await callback.answer("Немає оголошення для підтвердження.", show_alert=True)
         return
-    announcements.append(text)
-    save_json(ANNOUNCEMENTS_FILE, announcements)
-    for user_id in subscribers:
-        try:
-           await callback.bot.send_message(chat_id=user_id, text=f"📢 {text}")
-        except Exception as e:
-           print(f"Не вдалося надіслати користувачу {user_id}: {e}")
-    try: await callback.message.edit_text("✅ Оголошення надіслано й збережено.")
-    except: pass
+    ann_id = await state.allocate_id("announcement", announcement_store.last_id)
+    announcement_store.add(text, ann_id)
+    await state.events.publish("announcements")
+    await broadcaster.submit(registry.subscribers, f"📢 {text}", report_chat_id=user_id, announcement_id=ann_id)
+    await edit_cache.edit(callback.message, f"✅ Оголошення збережено. Розсилка на {len(registry.subscribers)} користувачів розпочата.")
     await callback.answer()
 
+DELIVERIES_PAGE = 10
+
+@router.message(Command("deliveries"))
+async def cmd_deliveries(message: Message):
+    if not registry.is_admin(message.from_user.id):
+        await message.answer("❌ У вас немає прав для цієї команди.")
+        return
+    parts = message.text.split()
+    if len(parts) > 1:
+        if not parts[1].isdigit() or announcement_store.get(int(parts[1])) is None:
+            await message.answer("Оголошення з таким ID немає.")
+            return
+        ann_ids = [int(parts[1])]
+    else:
+        ann_ids = announcement_store.ids[-DELIVERIES_PAGE:][::-1]
+    blocks = []
+    for ann_id in ann_ids:
+        record = announcement_store.get(ann_id)
+        preview = record["text"] if len(record["text"]) <= 40 else record["text"][:40] + "…"
+        delivery = announcement_store.delivery(ann_id)
+        if delivery is None:
+            details = "статистики немає (розсилка ще триває або була до появи статистики)"
+        else:
+            counts = {name: value for name, value in delivery.items() if name != "finished_at"}
+            details = f"з {counts['total']}, завершено {delivery['finished_at']}\n{format_stats(BroadcastStats(**counts))}"
+        blocks.append(f"#{ann_id} «{preview}»\n{details}")
+    await message.answer("\n\n".join(blocks) if blocks else "Немає оголошень.")
+
 @router.message(Command("announcements"))
 async def cmd_announcements(message: Message):
-    if not announcements:
+    ann_id = announcement_store.latest_id()
+    if ann_id is None:
         await message.answer("Немає оголошень.")
         return
-    index = len(announcements) - 1
-    text = f"📢 {announcements[index]}"
-    kb = get_announcement_kb(index, message.from_user.id)
-    await message.answer(text, reply_markup=kb)
+    text = announcement_text(ann_id)
+    kb = get_announcement_kb(ann_id, message.from_user.id)
+    sent = await message.answer(text, reply_markup=kb)
+    edit_cache.remember(sent, text, kb)
 
-@router.callback_query(lambda c: c.data and c.data.startswith("ann_"))
+@router.callback_query(lambda c: c.data and c.data.startswith("ann_"), flags={"throttling": NAV_POLICY})
 async def navigate_announcements(callback: CallbackQuery):
     parts = callback.data.split("_")
     if len(parts) < 3: 
         await callback.answer(); return
-    action, index = parts[1], int(parts[2])
+    action, ann_id = parts[1], int(parts[2])
     if action in ["next", "prev"]:
-        if not (0 <= index < len(announcements)): await callback.answer(); return
-        text = f"📢 {announcements[index]}"
-        kb = get_announcement_kb(index, callback.from_user.id)
-        try:
-            if kb: await callback.message.edit_text(text, reply_markup=kb)
-            else: await callback.message.edit_text(text)
-        except: pass
+        # Оголошення могли видалити після того, як кнопку намалювали — беремо найближче
+        ann_id = announcement_store.nearest_id(ann_id)
+        if ann_id is None: await callback.answer(); return
+        text = announcement_text(ann_id)
+        kb = get_announcement_kb(ann_id, callback.from_user.id)
+        await edit_cache.edit(callback.message, text, kb)
         await callback.answer()
         return
     if action == "del":
-        if callback.from_user.id not in ([ADMIN_USER_ID] + helpers):
+        if not registry.is_staff(callback.from_user.id):
             await callback.answer("❌ Немає прав.", show_alert=True); return
-        if not (0 <= index < len(announcements)):
-            await callback.answer("Помилка: індекс невалідний.", show_alert=True); return
-        deleted = announcements.pop(index)
-        save_json(ANNOUNCEMENTS_FILE, announcements)
-        if announcements:
-            new_index = min(index, len(announcements)-1)
-            text = f"📢 {announcements[new_index]}"
-            kb = get_announcement_kb(new_index, callback.from_user.id)
-            try:
-                if kb: await callback.message.edit_text(text, reply_markup=kb)
-                else: await callback.message.edit_text(text)
-            except: pass
+        deleted = announcement_store.delete(ann_id)
+        if deleted is None:
+            await callback.answer("Це оголошення вже видалено.", show_alert=True); return
+        await state.events.publish("announcements")
+        new_id = announcement_store.nearest_id(ann_id)
+        if new_id is not None:
+            text = announcement_text(new_id)
+            kb = get_announcement_kb(new_id, callback.from_user.id)
+            await edit_cache.edit(callback.message, text, kb)
         else:
-            try: await callback.message.edit_text(f"🗑 Видалено оголошення:\n\n{deleted}\n\nНаразі немає оголошень.")
-            except: pass
+            await edit_cache.edit(callback.message, f"🗑 Видалено оголошення:\n\n{deleted['text']}\n\nНаразі немає оголошень.")
         await callback.answer("Видалено ✅")
 
-@router.message()
-async def handle_text(message: Message):
-    text = (message.text or "").strip()
-    if text == "📅 Розклад":
-        if not schedule_data:
-            await message.answer("Розклад ще не додано.")
-            return
-        await message.answer("Оберіть клас (для сьогодні):", reply_markup=classes_kb_today)
+async def show_class_picker(message: Message, tomorrow: bool):
+    if not classes_list:
+        await message.answer("Розклад ще не додано.")
         return
-    if text == "📅 Завтра":
-        if not schedule_data:
-            await message.answer("Розклад ще не додано.")
-            return
+    if tomorrow:
         await message.answer("Оберіть клас (для завтрашнього дня):", reply_markup=classes_kb_tomorrow)
-        return
-    if text == "🍲 Меню":
-        await cmd_menu(message)
-        return
-    if text == "📢 Оголошення":
-        await cmd_announcements(message)
-        return
-    if text in schedule_data:
-        await show_schedule_for_class(message, text, tomorrow=False)
-        return
-    if text.endswith(" (завтра)"):
-        class_key = text.rsplit(" (завтра)", 1)[0]
-        if class_key in schedule_data:
-            await show_schedule_for_class(message, class_key, tomorrow=True)
-            return
-    await message.answer("Не розумію. Скористайтеся кнопками 👇", reply_markup=main_kb)
+    else:
+        await message.answer("Оберіть клас (для сьогодні):", reply_markup=classes_kb_today)
 
+# Текст кнопки -> (обробник, аргументи). Перебудовується разом із клавіатурами класів.
+def build_text_routes(classes):
+    routes = {
+        "📅 Розклад": (show_class_picker, (False,)),
+        "📅 Завтра": (show_class_picker, (True,)),
+        "🍲 Меню": (cmd_menu, ()),
+        "📢 Оголошення": (cmd_announcements, ()),
+        "🕒 Зараз": (show_now, ()),
+    }
+    for class_key in classes:
+        routes[class_key] = (show_schedule_for_class, (class_key, False))
+        routes[f"{class_key} (завтра)"] = (show_schedule_for_class, (class_key, True))
+        routes[f"{class_key} (зараз)"] = (show_now_for_class, (class_key,))
+    return routes
+
+@router.message()
+async def handle_text(message: Message):
+    route = text_routes.get((message.text or "").strip())
+    if route is None:
+        await message.answer("Не розумію. Скористайтеся кнопками 👇", reply_markup=main_kb)
+        return
+    handler, args = route
+    await handler(message, *args)
+
+
+if os.path.exists(TIMETABLE_FILE):
+    apply_compiled_timetable(load_json(TIMETABLE_FILE, {}))
+else:
+    apply_schedule(load_json(SCHEDULE_FILE, {}))
+
+
+async def archive_announcements():
+    if announcement_store.archive_expired():
+        await state.events.publish("announcements")
+
+def refresh_class_subscription(uid: str):
+    # Підписку змінив інший воркер
+    storage.refresh("class_subscriptions", uid)
+    leaderboard.set_class(int(uid), class_subscriptions.get(uid))
+
+# Колбеки Broadcaster: прибирання чатів, що заблокували бота, і статистика доставки
+async def prune_dead_chats(chat_ids):
+    removed = await registry.unsubscribe_many(chat_ids)
+    stale = [str(chat_id) for chat_id in chat_ids if str(chat_id) in class_subscriptions]
+    if stale:
+        storage.delete_many("class_subscriptions", stale)
+        for uid in stale:
+            leaderboard.set_class(int(uid), None)
+            await state.events.publish("class_subscriptions", uid)
+    logging.info("Прибрано недоступні чати: %s із підписників, %s із розкладу", removed, len(stale))
+
+async def record_delivery(ann_id: int, stats: BroadcastStats):
+    announcement_store.record_delivery(ann_id, stats.counts())
+
+async def on_startup(broadcaster: Broadcaster, redis):
+    global metrics_runner
+    storage.start()
+    if state.SHARED_STATE:
+        await state.enable_shared(redis)
+        await registry.attach(redis)
+        state.events.on("announcements", lambda _: announcement_store.reload())
+        state.events.on("class_subscriptions", refresh_class_subscription)
+    leaderboard.rebuild(await state.pets.scores(), {int(uid): class_key for uid, class_key in class_subscriptions.items()})
+    state.pet_listeners.append(leaderboard.set_score)
+    if METRICS_ENABLED:
+        metrics_runner = await metrics.start_metrics_server()
+    watcher.watch(SCHEDULE_FILE, apply_schedule)
+    watcher.watch(TIMETABLE_FILE, apply_compiled_timetable)
+    watcher.watch(MENU_FILE, apply_menu)
+    watcher.start()
+    # У спільному режимі кожну щоденну задачу виконує лише один воркер
+    jobs.start_daily(time(0, 0, 5), state.once_daily("sweep_hunger", sweep_hunger), run_at_start=True)
+    jobs.start_daily(time(0, 0, 10), state.once_daily("archive_announcements", archive_announcements), run_at_start=True)
+    jobs.start_daily(SCHEDULE_PUSH_TIME, state.once_daily("push_schedules", partial(push_tomorrow_schedules, broadcaster)))
+    # Розсилки воркерів, що зупинились посеред роботи, підхоплюються після спливу їхньої оренди
+    jobs.start_periodic(JOB_LEASE, broadcaster.resume_pending, run_at_start=True)
+
+async def on_shutdown():
+    await jobs.stop_all()
+    await watcher.stop()
+    await state.events.stop()
+    await storage.shutdown()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    if not WEBHOOK_SECRET:
+        # Без секрету будь-хто, хто знає адресу, може надсилати боту підроблені апдейти
+        raise SystemExit("❌ WEBHOOK_MODE потребує WEBHOOK_SECRET у config.py")
+    app = web.Application()
+    # handle_in_background: Telegram одразу отримує 200, а апдейт обробляється окремою задачею
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, handle_in_background=True, secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+    print(f"✅ Бот запущено (webhook на {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH})!")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 async def main():
     bot = Bot(token=TOKEN)
-    storage = RedisStorage.from_url('redis://localhost:6379/0')
+    redis_storage = RedisStorage.from_url('redis://localhost:6379/0')
     dp = Dispatcher()
+    dp["redis"] = redis_storage.redis
+    dp["broadcaster"] = Broadcaster(
+        bot, jobs=BroadcastJobStore(redis_storage.redis), on_dead=prune_dead_chats, on_finished=record_delivery
+    )
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     dp.include_router(liceychyk_router)  
     dp.include_router(router)
-    dp.message.middleware.register(ThrottlingMiddleware(storage=storage))    
+    dp.update.outer_middleware(ConcurrencyLimitMiddleware(MAX_CONCURRENT_UPDATES))
+    throttling = ThrottlingMiddleware(storage=redis_storage, router_policies={liceychyk_router: GAME_POLICY})
+    dp.message.middleware.register(throttling)
+    dp.callback_query.middleware.register(throttling)
+    if METRICS_ENABLED:
+        bot.session.middleware(metrics.ApiMetricsMiddleware())
+        dp.update.outer_middleware(metrics.UpdateMetricsMiddleware())
+        dp.message.middleware.register(metrics.HandlerMetricsMiddleware())
+        dp.callback_query.middleware.register(metrics.HandlerMetricsMiddleware())
+    if WEBHOOK_MODE:
+        await run_webhook(dp, bot)
+        return
     print("✅ Бот запущено!")
     await dp.start_polling(bot)
     
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,450 @@
+import uuid
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError,
+)
+from redis.asyncio import Redis
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 25        # повідомлень на секунду (ліміт Telegram ~30/с)
+PER_CHAT_INTERVAL = 1.0 # не частіше одного повідомлення в чат за секунду
+CONCURRENCY = 20
+BATCH_SIZE = 200
+MAX_RETRIES = 3
+TRANSIENT_BACKOFF = 1.0 # секунд до першого повтору після мережевої помилки, далі вдвічі більше
+FINISHED_JOB_TTL = 7 * 24 * 3600
+JOB_LEASE = 120         # секунд; поки розсилка йде, оренда продовжується кожні JOB_LEASE / 3
+
+# Продовжує оренду, лише якщо вона досі наша
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Результати доставки. Чати з DEAD_RESULTS більше ніколи не приймуть повідомлення.
+SENT = "sent"
+BLOCKED = "blocked"
+DEACTIVATED = "deactivated"
+CHAT_NOT_FOUND = "chat_not_found"
+TRANSIENT = "transient"
+ERROR = "error"
+DEAD_RESULTS = (BLOCKED, DEACTIVATED, CHAT_NOT_FOUND)
+FAILURE_RESULTS = (*DEAD_RESULTS, TRANSIENT, ERROR)
+
+
+def classify_error(e: Exception) -> str:
+    message = str(e).lower()
+    if isinstance(e, TelegramForbiddenError):
+        return DEACTIVATED if "deactivated" in message else BLOCKED
+    if isinstance(e, TelegramBadRequest):
+        if "chat not found" in message or "user not found" in message:
+            return CHAT_NOT_FOUND
+        return ERROR
+    if isinstance(e, (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError, OSError)):
+        return TRANSIENT
+    return ERROR
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    total: int
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    blocked: int = 0
+    deactivated: int = 0
+    chat_not_found: int = 0
+    transient: int = 0
+    error: int = 0
+    dead: List[int] = field(default_factory=list, repr=False)  # чати, які варто прибрати з розсилок
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    def record(self, chat_id: int, result: str):
+        if result == SENT:
+            self.sent += 1
+            return
+        self.failed += 1
+        setattr(self, result, getattr(self, result) + 1)
+        if result in DEAD_RESULTS:
+            self.dead.append(chat_id)
+
+    def counts(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in ("total", "sent", "failed", "retried", *FAILURE_RESULTS)}
+
+
+ProgressCallback = Callable[[BroadcastStats], Awaitable[None]]
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# Розсилки в Redis: текст, список отримувачів, курсор, множина вже оброблених чатів
+# і множина "мертвих" чатів, які приберемо з підписників після завершення
+class BroadcastJobStore:
+    ACTIVE_KEY = "broadcast:active"
+    NEXT_ID_KEY = "broadcast:next_id"
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.renew_script = redis.register_script(RENEW_LEASE_SCRIPT)
+
+    @staticmethod
+    def _key(job_id: int, suffix: str = "") -> str:
+        return f"broadcast:job:{job_id}{suffix}"
+
+    async def acquire(self, job_id: int) -> Optional[str]:
+        # Розсилку веде лише власник оренди; чужу беремо, тільки коли її оренда сплила.
+        # Токен свій для кожного запуску, тож навіть той самий процес не поведе розсилку двічі.
+        lease = uuid.uuid4().hex
+        if not await self.redis.set(self._key(job_id, ":owner"), lease, nx=True, ex=JOB_LEASE):
+            return None
+        if not await self.redis.sismember(self.ACTIVE_KEY, job_id):
+            # Розсилка встигла завершитися, поки ми переглядали список
+            await self.redis.delete(self._key(job_id, ":owner"))
+            return None
+        return lease
+
+    async def renew(self, job_id: int, lease: str) -> bool:
+        return bool(await self.renew_script(keys=[self._key(job_id, ":owner")], args=[lease, JOB_LEASE]))
+
+    async def create(self, text: str, chat_ids: List[int], report_chat_id: Optional[int],
+                     announcement_id: Optional[int] = None) -> Tuple[int, str]:
+        # Повертає ID розсилки й токен оренди, з яким її веде цей запуск
+        job_id = await self.redis.incr(self.NEXT_ID_KEY)
+        lease = uuid.uuid4().hex
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping={
+                "text": text,
+                "report_chat_id": report_chat_id if report_chat_id is not None else "",
+                "announcement_id": announcement_id if announcement_id is not None else "",
+                "cursor": 0,
+                **BroadcastStats(total=len(chat_ids)).counts(),
+            })
+            for start in range(0, len(chat_ids), BATCH_SIZE):
+                pipe.rpush(self._key(job_id, ":recipients"), *chat_ids[start:start + BATCH_SIZE])
+            pipe.set(self._key(job_id, ":owner"), lease, ex=JOB_LEASE)
+            pipe.sadd(self.ACTIVE_KEY, job_id)
+            await pipe.execute()
+        return job_id, lease
+
+    async def active(self) -> List[int]:
+        return sorted(int(job_id) for job_id in await self.redis.smembers(self.ACTIVE_KEY))
+
+    async def load(self, job_id: int) -> Optional[dict]:
+        raw = await self.redis.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = {_str(k): _str(v) for k, v in raw.items()}
+        for name in ("cursor", *BroadcastStats(total=0).counts()):
+            job[name] = int(job.get(name) or 0)
+        for name in ("report_chat_id", "announcement_id"):
+            job[name] = int(job[name]) if job.get(name) else None
+        return job
+
+    async def recipients(self, job_id: int, start: int, count: int) -> List[int]:
+        return [int(chat_id) for chat_id in await self.redis.lrange(self._key(job_id, ":recipients"), start, start + count - 1)]
+
+    async def claim(self, job_id: int, chat_ids: List[int]) -> List[int]:
+        # SADD повертає 1 лише для нових чатів, тож після перезапуску нікому не надішлемо двічі
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for chat_id in chat_ids:
+                pipe.sadd(self._key(job_id, ":done"), chat_id)
+            added = await pipe.execute()
+        return [chat_id for chat_id, is_new in zip(chat_ids, added) if is_new]
+
+    async def checkpoint(self, job_id: int, cursor: int, stats: BroadcastStats):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping={"cursor": cursor, **stats.counts()})
+            if stats.dead:
+                pipe.sadd(self._key(job_id, ":dead"), *stats.dead)
+            await pipe.execute()
+        stats.dead.clear()
+
+    async def dead(self, job_id: int) -> List[int]:
+        return [int(chat_id) for chat_id in await self.redis.smembers(self._key(job_id, ":dead"))]
+
+    async def finish(self, job_id: int):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.srem(self.ACTIVE_KEY, job_id)
+            pipe.delete(self._key(job_id, ":recipients"))
+            pipe.delete(self._key(job_id, ":dead"))
+            pipe.delete(self._key(job_id, ":owner"))
+            pipe.expire(self._key(job_id), FINISHED_JOB_TTL)
+            pipe.expire(self._key(job_id, ":done"), FINISHED_JOB_TTL)
+            await pipe.execute()
+
+
+def format_stats(stats: BroadcastStats) -> str:
+    text = f"Надіслано: {stats.sent}\nНе вдалося: {stats.failed}"
+    details = [
+        ("заблокували бота", stats.blocked), ("акаунт видалено", stats.deactivated),
+        ("чат не знайдено", stats.chat_not_found), ("мережеві помилки", stats.transient),
+        ("інші помилки", stats.error),
+    ]
+    text += "".join(f"\n  • {label}: {count}" for label, count in details if count)
+    text += f"\nПовторних спроб: {stats.retried}"
+    if stats.dead:
+        text += f"\nПрибрано з розсилки: {len(stats.dead)}"
+    return text
+
+
+# on_dead(chat_ids) викликається один раз наприкінці кожної розсилки зі всіма
+# чатами, що заблокували бота або зникли; on_finished(announcement_id, stats) —
+# після розсилки оголошення, щоб зберегти статистику доставки.
+class Broadcaster:
+    def __init__(self, bot: Bot, jobs: Optional[BroadcastJobStore] = None,
+                 rate: float = GLOBAL_RATE, concurrency: int = CONCURRENCY,
+                 on_dead: Optional[Callable[[List[int]], Awaitable[None]]] = None,
+                 on_finished: Optional[Callable[[int, BroadcastStats], Awaitable[None]]] = None):
+        self.bot = bot
+        self.jobs = jobs
+        self.on_dead = on_dead
+        self.on_finished = on_finished
+        self.limiter = RateLimiter(rate, burst=max(1, int(rate)))
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.chat_last_sent: Dict[int, float] = {}
+        self.paused_until = 0.0
+        self.tasks = set()
+        self.running: Set[int] = set()  # розсилки з Redis, які веде цей процес
+
+    async def _wait_chat(self, chat_id: int):
+        last = self.chat_last_sent.get(chat_id)
+        if last is not None:
+            delay = last + PER_CHAT_INTERVAL - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self.chat_last_sent[chat_id] = time.monotonic()
+
+    async def send(self, chat_id: int, text: str, stats: Optional[BroadcastStats] = None, **kwargs) -> str:
+        result = TRANSIENT
+        for attempt in range(MAX_RETRIES + 1):
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.limiter.acquire()
+            await self._wait_chat(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                result = SENT
+                break
+            except TelegramRetryAfter as e:
+                # Flood control діє на весь бот — пригальмовуємо всі відправки
+                self.paused_until = max(self.paused_until, time.monotonic() + e.retry_after)
+                result = TRANSIENT
+                logger.warning("RetryAfter %ss для %s (спроба %s)", e.retry_after, chat_id, attempt + 1)
+            except Exception as e:
+                result = classify_error(e)
+                if result != TRANSIENT:
+                    logger.info("Не вдалося надіслати користувачу %s (%s): %s", chat_id, result, e)
+                    break
+                logger.warning("Тимчасова помилка для %s (спроба %s): %s", chat_id, attempt + 1, e)
+                if attempt < MAX_RETRIES:
+                    # Мережа чи сервер Telegram — пробуємо ще, щоразу чекаючи довше
+                    await asyncio.sleep(TRANSIENT_BACKOFF * 2 ** attempt)
+            if attempt < MAX_RETRIES:
+                # Повтор рахуємо, лише якщо буде ще одна спроба
+                metrics.broadcast_messages_total.inc("retried")
+                if stats is not None:
+                    stats.retried += 1
+        metrics.broadcast_messages_total.inc(result)
+        if stats is not None:
+            stats.record(chat_id, result)
+        return result
+
+    async def _send_limited(self, chat_id: int, text: str, stats: BroadcastStats):
+        async with self.semaphore:
+            await self.send(chat_id, text, stats)
+
+    async def _send_batch(self, chat_ids: List[int], text: str, stats: BroadcastStats):
+        await asyncio.gather(*(self._send_limited(chat_id, text, stats) for chat_id in chat_ids))
+
+    async def _finish(self, stats: BroadcastStats, announcement_id: Optional[int]):
+        # Мертві чати прибираємо одним викликом на всю розсилку, а не по одному
+        if stats.dead and self.on_dead is not None:
+            await self.on_dead(list(stats.dead))
+        if announcement_id is not None and self.on_finished is not None:
+            await self.on_finished(announcement_id, stats)
+
+    async def run(self, chat_ids: Iterable[int], text: str,
+                  on_progress: Optional[ProgressCallback] = None,
+                  announcement_id: Optional[int] = None) -> BroadcastStats:
+        chat_ids = list(chat_ids)
+        stats = BroadcastStats(total=len(chat_ids))
+        metrics.broadcast_pending.inc(amount=len(chat_ids))
+        for start in range(0, len(chat_ids), BATCH_SIZE):
+            batch = chat_ids[start:start + BATCH_SIZE]
+            try:
+                await self._send_batch(batch, text, stats)
+            finally:
+                metrics.broadcast_pending.inc(amount=-len(batch))
+            if on_progress and stats.done < stats.total:
+                await on_progress(stats)
+        await self._finish(stats, announcement_id)
+        return stats
+
+    async def _keep_lease(self, job_id: int, lease: str, lost: asyncio.Event):
+        # Окремою задачею, бо одна партія може тривати довше за оренду (RetryAfter, повтори)
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            try:
+                renewed = await self.jobs.renew(job_id, lease)
+            except Exception as e:
+                logger.warning("Не вдалося продовжити оренду розсилки #%s: %s", job_id, e)
+                continue
+            if not renewed:
+                lost.set()
+                return
+
+    async def run_job(self, job_id: int, lease: str,
+                      on_progress: Optional[ProgressCallback] = None) -> Optional[BroadcastStats]:
+        lost = asyncio.Event()
+        keeper = asyncio.create_task(self._keep_lease(job_id, lease, lost))
+        try:
+            return await self._run_job(job_id, lost, on_progress)
+        finally:
+            keeper.cancel()
+            self.running.discard(job_id)
+
+    async def _run_job(self, job_id: int, lost: asyncio.Event,
+                       on_progress: Optional[ProgressCallback]) -> Optional[BroadcastStats]:
+        job = await self.jobs.load(job_id)
+        if job is None:
+            return None
+        stats = BroadcastStats(**{name: job[name] for name in BroadcastStats(total=0).counts()})
+        cursor = job["cursor"]
+        remaining = job["total"] - cursor
+        metrics.broadcast_pending.inc(amount=remaining)
+        try:
+            while cursor < job["total"]:
+                batch = await self.jobs.recipients(job_id, cursor, BATCH_SIZE)
+                if not batch:
+                    break
+                claimed = await self.jobs.claim(job_id, batch)
+                await self._send_batch(claimed, job["text"], stats)
+                cursor += len(batch)
+                remaining -= len(batch)
+                metrics.broadcast_pending.inc(amount=-len(batch))
+                if lost.is_set():
+                    # Оренду не вдалося продовжити, і розсилку вже підхопив інший воркер
+                    logger.warning("Розсилку #%s веде інший воркер, зупиняюсь", job_id)
+                    return None
+                await self.jobs.checkpoint(job_id, cursor, stats)
+                if on_progress and cursor < job["total"]:
+                    await on_progress(stats)
+        finally:
+            metrics.broadcast_pending.inc(amount=-remaining)
+        # Якщо впадемо між _finish і finish, після перезапуску _finish повториться — обидва колбеки ідемпотентні
+        stats.dead = await self.jobs.dead(job_id)
+        await self._finish(stats, job["announcement_id"])
+        await self.jobs.finish(job_id)
+        return stats
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def submit(self, chat_ids: Iterable[int], text: str, report_chat_id: Optional[int] = None,
+                     announcement_id: Optional[int] = None) -> asyncio.Task:
+        chat_ids = list(chat_ids)
+        if self.jobs is None:
+            return self._spawn(self._report(
+                lambda progress: self.run(chat_ids, text, progress, announcement_id), report_chat_id
+            ))
+        job_id, lease = await self.jobs.create(text, chat_ids, report_chat_id, announcement_id)
+        self.running.add(job_id)
+        return self._spawn(self._report(lambda progress: self.run_job(job_id, lease, progress), report_chat_id))
+
+    async def resume_pending(self):
+        # Викликається періодично: підхоплює розсилки, чий воркер зупинився й не продовжив оренду
+        if self.jobs is None:
+            return
+        for job_id in await self.jobs.active():
+            if job_id in self.running:
+                continue
+            lease = await self.jobs.acquire(job_id)
+            if lease is None:
+                continue
+            job = await self.jobs.load(job_id)
+            if job is None:
+                continue
+            self.running.add(job_id)
+            report_chat_id = job["report_chat_id"]
+            logger.info("Відновлюю розсилку #%s з позиції %s/%s", job_id, job["cursor"], job["total"])
+            if report_chat_id is not None:
+                try:
+                    await self.bot.send_message(
+                        report_chat_id, f"♻️ Розсилку #{job_id} відновлено після перезапуску ({job['cursor']}/{job['total']})."
+                    )
+                except Exception as e:
+                    logger.info("Не вдалося повідомити про відновлення розсилки: %s", e)
+            self._spawn(self._report(
+                lambda progress, job_id=job_id, lease=lease: self.run_job(job_id, lease, progress), report_chat_id
+            ))
+
+    async def _report(self, make_run, report_chat_id: Optional[int]):
+        progress_message = None
+
+        async def report_progress(stats: BroadcastStats):
+            nonlocal progress_message
+            if report_chat_id is None:
+                return
+            progress_text = f"📤 Розсилка: {stats.done}/{stats.total}"
+            try:
+                if progress_message is None:
+                    progress_message = await self.bot.send_message(report_chat_id, progress_text)
+                else:
+                    await progress_message.edit_text(progress_text)
+            except Exception as e:
+                logger.info("Не вдалося оновити прогрес розсилки: %s", e)
+
+        try:
+            stats = await make_run(report_progress)
+        except Exception:
+            logger.exception("Розсилка завершилась з помилкою")
+            if report_chat_id is not None:
+                await self.bot.send_message(report_chat_id, "❌ Розсилка перервалась через помилку.")
+            return None
+
+        if stats is not None and report_chat_id is not None:
+            await self.bot.send_message(
+                report_chat_id,
+                f"✅ Розсилку завершено.\n\n{format_stats(stats)}"
+            )
+        return stats
@@ -0,0 +1,57 @@
+import logging
+from collections import OrderedDict
+from typing import Optional
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, InlineKeyboardMarkup
+import metrics
+import state
+
+logger = logging.getLogger(__name__)
+
+EDIT_CACHE_SIZE = 5000
+
+# Останній відрендерений текст і клавіатура для кожного (chat, message).
+# Якщо нове редагування нічого не змінює, запит до Telegram не надсилається.
+# Кеш живе в пам'яті процесу, тож у спільному режимі (SHARED_STATE) він вимкнений:
+# те саме повідомлення могли змінити інші воркери, і кеш помилково пропустив би
+# редагування. Тоді зайві запити відсіює відповідь "message is not modified".
+class EditCache:
+    def __init__(self, size: int = EDIT_CACHE_SIZE):
+        self.size = size
+        self.rendered = OrderedDict()
+
+    def remember(self, message: Message, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        # Для щойно надісланих повідомлень: перше ж редагування без змін буде пропущено
+        self._remember((message.chat.id, message.message_id), (text, reply_markup))
+
+    def _remember(self, key, rendered):
+        if not self.size:
+            return
+        self.rendered[key] = rendered
+        self.rendered.move_to_end(key)
+        if len(self.rendered) > self.size:
+            self.rendered.popitem(last=False)
+
+    async def edit(self, message: Message, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        key = (message.chat.id, message.message_id)
+        rendered = (text, reply_markup)
+        if self.rendered.get(key) == rendered:
+            self.rendered.move_to_end(key)
+            metrics.edits_skipped_total.inc("cached")
+            return False
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            if "message is not modified" in e.message:
+                # Повідомлення вже таке, але ми про це не знали (наприклад, після перезапуску)
+                metrics.edits_skipped_total.inc("not_modified")
+                self._remember(key, rendered)
+                return False
+            logger.warning("Не вдалося відредагувати повідомлення %s: %s", key, e.message)
+            self.rendered.pop(key, None)
+            return False
+        self._remember(key, rendered)
+        return True
+
+
+edit_cache = EditCache(size=0 if state.SHARED_STATE else EDIT_CACHE_SIZE)
@@ -0,0 +1,53 @@
+import asyncio
+import inspect
+import logging
+from datetime import datetime, time, timedelta
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+tasks = set()
+
+
+async def _call(job: Callable):
+    try:
+        result = job()
+        if inspect.isawaitable(result):
+            await result
+    except Exception:
+        logger.exception("Фонова задача %s завершилась з помилкою", getattr(job, "__name__", job))
+
+async def run_daily(at: time, job: Callable, run_at_start: bool = False):
+    if run_at_start:
+        await _call(job)
+    while True:
+        now = datetime.now()
+        next_run = datetime.combine(now.date(), at)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        await _call(job)
+
+async def run_periodic(interval: float, job: Callable, run_at_start: bool = False):
+    if run_at_start:
+        await _call(job)
+    while True:
+        await asyncio.sleep(interval)
+        await _call(job)
+
+def start_periodic(interval: float, job: Callable, run_at_start: bool = False) -> asyncio.Task:
+    task = asyncio.create_task(run_periodic(interval, job, run_at_start))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+def start_daily(at: time, job: Callable, run_at_start: bool = False) -> asyncio.Task:
+    task = asyncio.create_task(run_daily(at, job, run_at_start))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+async def stop_all():
+    for task in list(tasks):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
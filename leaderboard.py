@@ -0,0 +1,91 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Відсортований за (-xp, uid) список живих Ліцейчиків. Пошук позиції — бісекція,
+# тож top(k) і rank() не сортують усе заново; вставка й видалення зсувають
+# лише хвіст списку.
+class Board:
+    def __init__(self):
+        self.order: List[Tuple[int, int]] = []
+        self.keys: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    @classmethod
+    def build(cls, scores: Iterable[Tuple[int, int]]) -> "Board":
+        # Початкова побудова: одне сортування замість insort на кожен запис
+        board = cls()
+        board.keys = {uid: (-xp, uid) for uid, xp in scores}
+        board.order = sorted(board.keys.values())
+        return board
+
+    def set(self, uid: int, xp: Optional[int]):
+        old = self.keys.get(uid)
+        new = (-xp, uid) if xp is not None else None
+        if old == new:
+            return
+        if old is not None:
+            del self.order[bisect_left(self.order, old)]
+            del self.keys[uid]
+        if new is not None:
+            insort(self.order, new)
+            self.keys[uid] = new
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        return [(uid, -negative_xp) for negative_xp, uid in self.order[:k]]
+
+    def rank(self, uid: int) -> Optional[int]:
+        key = self.keys.get(uid)
+        return bisect_left(self.order, key) + 1 if key is not None else None
+
+
+# Загальний рейтинг і рейтинги класів. Клас учня береться з підписки на розклад
+# (/subscribe), тож у рейтингу класу лише ті, хто на нього підписаний.
+class Leaderboard:
+    def __init__(self):
+        self.overall = Board()
+        self.by_class: Dict[str, Board] = {}
+        self.scores: Dict[int, Optional[int]] = {}
+        self.classes: Dict[int, str] = {}
+
+    def rebuild(self, scores: Iterable[Tuple[int, Optional[int]]], classes: Dict[int, str]):
+        self.scores = dict(scores)
+        self.classes = dict(classes)
+        alive = [(uid, xp) for uid, xp in self.scores.items() if xp is not None]
+        grouped: Dict[str, List[Tuple[int, int]]] = {}
+        for uid, xp in alive:
+            class_key = self.classes.get(uid)
+            if class_key is not None:
+                grouped.setdefault(class_key, []).append((uid, xp))
+        self.overall = Board.build(alive)
+        self.by_class = {class_key: Board.build(members) for class_key, members in grouped.items()}
+
+    def board(self, class_key: str = None) -> Optional[Board]:
+        return self.overall if class_key is None else self.by_class.get(class_key)
+
+    def set_score(self, uid: int, xp: Optional[int]):
+        # xp = None — Ліцейчик помер або видалений і з рейтингу випадає
+        self.scores[uid] = xp
+        self.overall.set(uid, xp)
+        class_key = self.classes.get(uid)
+        if class_key is not None:
+            self.by_class.setdefault(class_key, Board()).set(uid, xp)
+
+    def set_class(self, uid: int, class_key: Optional[str]):
+        old = self.classes.get(uid)
+        if old == class_key:
+            return
+        if old is not None:
+            # Дошки класу могло й не бути: rebuild створює їх лише для класів з живими Ліцейчиками
+            board = self.by_class.get(old)
+            if board is not None:
+                board.set(uid, None)
+            del self.classes[uid]
+        if class_key is not None:
+            self.classes[uid] = class_key
+            self.by_class.setdefault(class_key, Board()).set(uid, self.scores.get(uid))
+
+
+leaderboard = Leaderboard()
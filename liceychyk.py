@@ -1,42 +1,25 @@
-import os
-import json
+import time
 import random
-from datetime import date, timedelta
+from dataclasses import replace
+from datetime import date
 from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.filters import Command
-from config import ADMIN_USER_ID
+import state
+from pets import Pet, today_ordinal
+from leaderboard import leaderboard
+from registry import registry
+from middleware import GAME_POLICY
 
 main_kb = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="📅 Розклад"), KeyboardButton(text="📅 Завтра")],
         [KeyboardButton(text="🍲 Меню"), KeyboardButton(text="🧸 Мій Ліцейчик")],
-        [KeyboardButton(text="📢 Оголошення")]
+        [KeyboardButton(text="📢 Оголошення"), KeyboardButton(text="🕒 Зараз")]
     ],
     resize_keyboard=True
 )
 
-DATA_DIR = "data"
-os.makedirs(DATA_DIR, exist_ok=True)
-
-AUTHORIZED_LICEYCHYK_FILE = os.path.join(DATA_DIR, "authorized_liceychyk.json")
-TAMAGOTCHI_FILE = os.path.join(DATA_DIR, "tamagotchi.json")
-
-def load_json(path, default):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    else:
-        save_json(path, default)
-        return default
-
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-authorized_liceychyk = load_json(AUTHORIZED_LICEYCHYK_FILE, [])
-tamagotchi_data = load_json(TAMAGOTCHI_FILE, {})
-
 FOOD_EMOJIS = [
     "🍏", "🍎", "🍐", "🍊", "🍋", "🍌", "🍉", "🍇", "🍓", "🫐", "🍈", "🍒", "🍑", "🥭", "🍍", "🥥", "🥝",
     "🍅", "🍆", "🥑", "🥦", "🥬", "🥒", "🌶️", "🌽", "🥕", "🫒", "🧄", "🧅", "🥔", "🍠", "🥐", "🥯", "🍞",
@@ -47,6 +30,8 @@ FOOD_EMOJIS = [
     "🧉", "🍶", "🍺", "🍻", "🥂", "🍷", "🥃", "🍸", "🍹", "🧊", "🫖", "🍾", 
 ]
 
+FOOD_CHOICES = frozenset([*FOOD_EMOJIS, "🧪"])
+
 DEATH_QUOTES = [
     "Як ви могли??",
     "У вас немає серця...",
@@ -59,64 +44,50 @@ DEATH_QUOTES = [
 
 liceychyk_router = Router()
 
+FEED_POLICY = replace(GAME_POLICY, cost=3)
+
 GOOD_REPLIES = ["Смачно!", "Дякую!", "Це моє улюблене!", "Обожнюю це!", "Ще давай!"]
 BAD_REPLIES = ["Фу!", "Це не смачно...", "Мені не подобається", "Я краще без цього", "Їж це сам!"]
 POTION_REPLIES = ["Ого! Енергія!", "Це дивовижно!", "Я відчуваю силу!", "Магія!", "Тепер я супер!"]
 
-def apply_hunger(uid: str):
-    data = tamagotchi_data[uid]
-    if not data["alive"]:
-        return
+HUNGER_DAYS = 3
+TOP_SIZE = 10
+TOP_CACHE_SECONDS = 30
 
-    last_fed = date.fromisoformat(data["last_fed"])
-    today = date.today()
-    days_without_food = (today - last_fed).days
+# Клас (None — загальний рейтинг) -> (коли застаріє, текст сторінки)
+top_cache = {}
 
-    if days_without_food >= 3:
-        data["alive"] = False
-        data["died_at"] = str(today)
-        data["xp"] = 0
-        tamagotchi_data[uid] = data
-        save_json(TAMAGOTCHI_FILE, tamagotchi_data)
+# Один прохід по всіх Ліцейчиках раз на добу, всі зміни зберігаємо одним записом
+async def sweep_hunger(today: date = None) -> int:
+    day = (today or date.today()).toordinal()
+    return await state.pets.sweep_hunger(day - HUNGER_DAYS, day)
 
-def can_revive(uid: str) -> bool:
-    data = tamagotchi_data.get(uid, {})
-    if data.get("alive", True):
-        return False
-    died_at_str = data.get("died_at")
-    if not died_at_str:
+def can_revive(pet: Pet) -> bool:
+    if pet.alive or pet.died_at is None:
         return False
-    died_at = date.fromisoformat(died_at_str)
-    days_since_death = (date.today() - died_at).days
-    return days_since_death >= 2
+    return today_ordinal() - pet.died_at >= 2
 
-async def show_liceychyk_profile(message: Message, uid: str):
-    apply_hunger(uid)
+async def show_liceychyk_profile(message: Message, pet: Pet):
+    status = "живий" if pet.alive else "мертвий"
+    text = f"Ліцейчик\n\nДосвід: {pet.xp}\nСтан: {status}\nОстаннє годування: {date.fromordinal(pet.last_fed)}"
 
-    data = tamagotchi_data[uid]
-    xp = data["xp"]
-    alive = data["alive"]
-    last_fed = data["last_fed"]
-    status = "живий" if alive else "мертвий"
-    text = f"Ліцейчик\n\nДосвід: {xp}\nСтан: {status}\nОстаннє годування: {last_fed}"
+    just_died = not pet.alive and pet.died_at == today_ordinal()
 
-    just_died = not alive and "died_at" in data and data["died_at"] == str(date.today())
-
-    if alive:
+    if pet.alive:
         feed_kb = ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(text="🍽 Погодувати")]],
             resize_keyboard=True
         )
         await message.answer(text, reply_markup=feed_kb)
     else:
-        if "died_at" in data:
-            text += f"\nПомер: {data['died_at']}"
+        if pet.died_at is not None:
+            text += f"\nПомер: {date.fromordinal(pet.died_at)}"
         await message.answer(text)
 
         if just_died:
             await message.answer(f"💔 {random.choice(DEATH_QUOTES)}")
 
-        if can_revive(uid):
+        if can_revive(pet):
             revive_kb = ReplyKeyboardMarkup(
                 keyboard=[[KeyboardButton(text="💫 Відродити")]],
                 resize_keyboard=True
@@ -127,7 +98,7 @@ async def show_liceychyk_profile(message: Message, uid: str):
 
 @liceychyk_router.message(Command("killliceychyk"))
 async def cmd_kill_liceychyk(message: Message):
-    if message.from_user.id != ADMIN_USER_ID:
+    if not registry.is_admin(message.from_user.id):
         return
     parts = message.text.split()
     if len(parts) < 2:
@@ -136,18 +107,18 @@ async def cmd_kill_liceychyk(message: Message):
         user_id = int(parts[1])
     except:
         return
-    uid = str(user_id)
-    if uid in tamagotchi_data:
-        data = tamagotchi_data[uid]
-        data["last_fed"] = str(date.today() - timedelta(days=3))
-        data["alive"] = True
-        tamagotchi_data[uid] = data
-        save_json(TAMAGOTCHI_FILE, tamagotchi_data)
+    def starve(pet):
+        pet.last_fed = today_ordinal() - HUNGER_DAYS
+        pet.alive = True
+        return pet
+
+    if await state.pets.update(user_id, starve) is not None:
+        await sweep_hunger()
         await message.answer("💀 Голод на 3 дні встановлено.")
 
 @liceychyk_router.message(Command("coolliceychyk"))
 async def cmd_cooldown_liceychyk(message: Message):
-    if message.from_user.id != ADMIN_USER_ID:
+    if not registry.is_admin(message.from_user.id):
         await message.answer("❌ У вас немає прав.")
         return
     parts = message.text.split()
@@ -160,23 +131,22 @@ async def cmd_cooldown_liceychyk(message: Message):
         await message.answer("Невірний ID.")
         return
 
-    uid = str(user_id)
-    if uid not in tamagotchi_data:
+    yesterday = today_ordinal() - 1
+
+    def reset_cooldowns(pet):
+        pet.last_fed = yesterday
+        pet.last_quiz = None
+        pet.last_daily = yesterday
+        return pet
+
+    if await state.pets.update(user_id, reset_cooldowns) is None:
         await message.answer("У цього користувача немає Ліцейчика.")
         return
-
-    yesterday = str(date.today() - timedelta(days=1))
-    data = tamagotchi_data[uid]
-    data["last_fed"] = yesterday
-    data["last_quiz"] = None
-    data["last_daily"] = yesterday
-    tamagotchi_data[uid] = data
-    save_json(TAMAGOTCHI_FILE, tamagotchi_data)
     await message.answer(f"✅ Кулдауни для {user_id} скинуто.")
 
 @liceychyk_router.message(Command("deleteliceychyk"))
 async def cmd_delete_liceychyk(message: Message):
-    if message.from_user.id != ADMIN_USER_ID:
+    if not registry.is_admin(message.from_user.id):
         await message.answer("❌ У вас немає прав.")
         return
     parts = message.text.split()
@@ -189,18 +159,14 @@ async def cmd_delete_liceychyk(message: Message):
         await message.answer("Невірний ID.")
         return
 
-    uid = str(user_id)
-    if uid not in tamagotchi_data:
+    if not await state.pets.delete(user_id):
         await message.answer("У цього користувача немає Ліцейчика.")
         return
-
-    del tamagotchi_data[uid]
-    save_json(TAMAGOTCHI_FILE, tamagotchi_data)
     await message.answer(f"🗑 Ліцейчик для {user_id} видалено.")
 
 @liceychyk_router.message(Command("addliceychyk"))
 async def cmd_add_liceychyk(message: Message):
-    if message.from_user.id != ADMIN_USER_ID:
+    if not registry.is_admin(message.from_user.id):
         await message.answer("❌ У вас немає прав для цієї команди.")
         return
     parts = message.text.split()
@@ -212,9 +178,7 @@ async def cmd_add_liceychyk(message: Message):
     except ValueError:
         await message.answer("Невірний ID.")
         return
-    if user_id not in authorized_liceychyk:
-        authorized_liceychyk.append(user_id)
-        save_json(AUTHORIZED_LICEYCHYK_FILE, authorized_liceychyk)
+    if await registry.authorize(user_id):
         await message.answer("✅ Користувача дозволено мати Ліцейчика.")
     else:
         await message.answer("🔹 Цей користувач уже авторизований.")
@@ -230,113 +194,113 @@ def get_feed_keyboard():
 @liceychyk_router.message(F.text == "🧸 Мій Ліцейчик")
 async def show_liceychyk(message: Message):
     user_id = message.from_user.id
-    if user_id not in authorized_liceychyk:
+    if not registry.is_authorized(user_id):
         await message.answer("❌ Лише авторизовані учні можуть завести Ліцейчика.")
         return
 
-    uid = str(user_id)
-    if uid not in tamagotchi_data:
-        tamagotchi_data[uid] = {
-            "xp": 100,
-            "alive": True,
-            "last_fed": str(date.today()),
-            "last_quiz": None,
-            "last_daily": str(date.today())
-        }
-        save_json(TAMAGOTCHI_FILE, tamagotchi_data)
+    if await state.pets.create(user_id, Pet.new()):
         await message.answer("🐣 Вітаю! Твій Ліцейчик народився!\n\nДосвід: 100\nСтан: живий\nОстаннє годування: сьогодні")
         return
 
-    await show_liceychyk_profile(message, uid)
+    await show_liceychyk_profile(message, await state.pets.get(user_id))
 
 @liceychyk_router.message(F.text == "🍽 Погодувати")
 async def feed_liceychyk_start(message: Message):
-    user_id = message.from_user.id
-    uid = str(user_id)
-
-    if uid not in tamagotchi_data:
+    pet = await state.pets.get(message.from_user.id)
+    if pet is None:
         await message.answer("Спочатку заведи Ліцейчика!")
         return
 
-    data = tamagotchi_data[uid]
-    if not data["alive"]:
+    if not pet.alive:
         await message.answer("Ліцейчик мертвий... Спочатку відроди його.")
         return
 
-    if data["last_fed"] == str(date.today()):
+    if pet.last_fed == today_ordinal():
         await message.answer("Вже годував сьогодні! Завтра знову можна.")
         return
 
     await message.answer("Чим погодувати Ліцейчика?", reply_markup=get_feed_keyboard())
 
-@liceychyk_router.message(F.text.in_([*FOOD_EMOJIS, "🧪"]))
+@liceychyk_router.message(F.text.in_(FOOD_CHOICES), flags={"throttling": FEED_POLICY})
 async def feed_liceychyk_choice(message: Message):
-    user_id = message.from_user.id
-    uid = str(user_id)
     chosen = message.text
-
-    if uid not in tamagotchi_data:
-        await message.answer("Спочатку заведи Ліцейчика!", reply_markup=main_kb)
-        return
-
-    data = tamagotchi_data[uid]
-    if not data["alive"]:
-        await message.answer("Ліцейчик мертвий... Спочатку відроди його.", reply_markup=main_kb)
-        return
-
-    if data["last_fed"] == str(date.today()):
-        await message.answer("Вже годував сьогодні!", reply_markup=main_kb)
-        return
-
-    if chosen == "🧪":
-        data["xp"] += 15
-        reply = random.choice(POTION_REPLIES) + " (+15 досвіду)"
-    elif chosen in FOOD_EMOJIS:
-        if random.random() < 0.2:
-            data["xp"] -= 5
+    today = today_ordinal()
+    # Перевірки й зміна робляться всередині state.pets.update, щоб два апдейти
+    # одночасно не погодували Ліцейчика двічі
+    outcome = None
+
+    def feed(pet):
+        nonlocal outcome
+        if not pet.alive:
+            outcome = "Ліцейчик мертвий... Спочатку відроди його."
+            return None
+        if pet.last_fed == today:
+            outcome = "Вже годував сьогодні!"
+            return None
+
+        if chosen == "🧪":
+            pet.xp += 15
+            reply = random.choice(POTION_REPLIES) + " (+15 досвіду)"
+        elif random.random() < 0.2:
+            pet.xp -= 5
             reply = random.choice(BAD_REPLIES) + " (-5 досвіду)"
         else:
             reply = random.choice(GOOD_REPLIES)
-    else:
-        await message.answer("Невідома їжа.", reply_markup=main_kb)
-        return
 
-    if data["xp"] <= 0:
-        data["xp"] = 0
-        data["alive"] = False
-        data["died_at"] = str(date.today())
+        if pet.xp <= 0:
+            pet.starve(today)
 
-    data["last_fed"] = str(date.today())
-    tamagotchi_data[uid] = data
-    save_json(TAMAGOTCHI_FILE, tamagotchi_data)
+        pet.last_fed = today
+        outcome = f"Ліцейчик: {reply}"
+        return pet
 
-    await message.answer(f"Ліцейчик: {reply}", reply_markup=main_kb)
+    await state.pets.update(message.from_user.id, feed)
+    await message.answer(outcome or "Спочатку заведи Ліцейчика!", reply_markup=main_kb)
 
 @liceychyk_router.message(F.text == "💫 Відродити")
 async def revive_liceychyk(message: Message):
-    user_id = message.from_user.id
-    uid = str(user_id)
-
-    if uid not in tamagotchi_data:
-        await message.answer("Спочатку заведи Ліцейчика!")
+    refusal = "Спочатку заведи Ліцейчика!"
+
+    def revive(pet):
+        nonlocal refusal
+        if pet.alive:
+            refusal = "Ліцейчик уже живий!"
+            return None
+        if not can_revive(pet):
+            refusal = "Ще не час відроджувати... Почекай ще трохи."
+            return None
+        return Pet.new()
+
+    pet = await state.pets.update(message.from_user.id, revive)
+    if pet is None:
+        await message.answer(refusal)
         return
-
-    data = tamagotchi_data[uid]
-    if data.get("alive", False):
-        await message.answer("Ліцейчик уже живий!")
-        return
-
-    if not can_revive(uid):
-        await message.answer("Ще не час відроджувати... Почекай ще трохи.")
-        return
-
-    tamagotchi_data[uid] = {
-        "xp": 100,
-        "alive": True,
-        "last_fed": str(date.today()),
-        "last_quiz": None,
-        "last_daily": str(date.today())
-    }
-    save_json(TAMAGOTCHI_FILE, tamagotchi_data)
     await message.answer("✨ Ліцейчик відродився! Тепер він знову з тобою.")
-    await show_liceychyk_profile(message, uid)
\ No newline at end of file
+    await show_liceychyk_profile(message, pet)
+
+def render_top(class_key: str = None) -> str:
+    cached = top_cache.get(class_key)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    title = f"🏆 Найдосвідченіші Ліцейчики {class_key}" if class_key else "🏆 Найдосвідченіші Ліцейчики"
+    lines = [f"{place}. Ліцейчик …{str(uid)[-4:]} — {xp} досвіду"
+             for place, (uid, xp) in enumerate(leaderboard.board(class_key).top(TOP_SIZE), start=1)]
+    text = title + "\n\n" + "\n".join(lines)
+    top_cache[class_key] = (now + TOP_CACHE_SECONDS, text)
+    return text
+
+@liceychyk_router.message(Command("top"))
+async def cmd_top(message: Message):
+    parts = message.text.split(maxsplit=1)
+    class_key = parts[1].strip() if len(parts) > 1 else None
+    board = leaderboard.board(class_key)
+    if board is None or not len(board):
+        if class_key:
+            await message.answer(f"У рейтингу {class_key} ще нікого немає. Учні потрапляють сюди після /subscribe {class_key}.")
+        else:
+            await message.answer("У рейтингу ще немає живих Ліцейчиків.")
+        return
+    rank = board.rank(message.from_user.id)
+    footer = f"Твоє місце: {rank} з {len(board)}" if rank else "Твого Ліцейчика в цьому рейтингу немає."
+    await message.answer(f"{render_top(class_key)}\n\n{footer}")
@@ -0,0 +1,163 @@
+import time
+import logging
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+import config
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = getattr(config, "METRICS_HOST", "127.0.0.1")
+METRICS_PORT = getattr(config, "METRICS_PORT", 9100)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.values: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield from super().render()
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, *labels, value: float):
+        state = self.values.get(labels)
+        if state is None:
+            # лічильники по кошиках (останній — +Inf), сума і кількість
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self):
+        yield from super().render()
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {count}"
+
+
+REGISTRY = []
+
+updates_total = Counter("bot_updates_total", "Отримані апдейти за типом", ("type",))
+update_seconds = Histogram("bot_update_seconds", "Повний час обробки апдейта", ("type",))
+handler_seconds = Histogram("bot_handler_seconds", "Час роботи обробника", ("handler",))
+handler_errors_total = Counter("bot_handler_errors_total", "Винятки в обробниках", ("handler",))
+throttled_total = Counter("bot_throttled_total", "Відхилені антифлудом події", ("bucket",))
+api_seconds = Histogram("telegram_api_seconds", "Тривалість запитів до Telegram API", ("method",))
+api_errors_total = Counter("telegram_api_errors_total", "Помилки Telegram API", ("method", "error"))
+storage_flush_seconds = Histogram("storage_flush_seconds", "Тривалість запису датасету на диск", ("dataset",))
+storage_flush_bytes = Histogram("storage_flush_bytes", "Розмір записаного датасету", ("dataset",), buckets=SIZE_BUCKETS)
+broadcast_messages_total = Counter("broadcast_messages_total", "Результати відправки в розсилках", ("result",))
+edits_skipped_total = Counter("bot_edits_skipped_total", "Редагування, які не змінили повідомлення", ("reason",))
+broadcast_pending = Gauge("broadcast_pending", "Отримувачі, яким ще не надіслано активні розсилки")
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Зовнішній middleware на dp.update: тип апдейта і повний час обробки
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]], event: TelegramObject, data: Dict) -> Any:
+        event_type = getattr(event, "event_type", type(event).__name__)
+        updates_total.inc(event_type)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_seconds.observe(event_type, value=time.perf_counter() - started)
+
+
+# Внутрішній middleware: тут уже відомо, який саме обробник спрацював
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]], event: TelegramObject, data: Dict) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors_total.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(name, value=time.perf_counter() - started)
+
+
+# Middleware сесії бота: кожен виклик Telegram API
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors_total.inc(name, type(e).__name__)
+            raise
+        finally:
+            api_seconds.observe(name, value=time.perf_counter() - started)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступні на http://%s:%s/metrics", host, port)
+    return runner
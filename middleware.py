@@ -1,22 +1,124 @@
-from typing import Any, Awaitable, Callable, Dict
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram.fsm.storage.redis import RedisStorage
-from aiogram import BaseMiddleware
-from aiogram.types import TelegramObject, Message
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, CallbackQuery
 from config import FLOOD_TIMING
+import metrics
 
+LOCAL_CACHE_SIZE = 10000
+
+@dataclass(frozen=True)
+class ThrottlePolicy:
+    bucket: str    # політики з однаковим bucket ділять спільний запас токенів
+    rate: float    # токенів на секунду
+    burst: int     # місткість відра
+    cost: float = 1
+
+DEFAULT_POLICY = ThrottlePolicy("user", rate=1 / FLOOD_TIMING, burst=5)
+CHEAP_POLICY = replace(DEFAULT_POLICY, cost=0.5)
+HEAVY_POLICY = replace(DEFAULT_POLICY, cost=3)
+NAV_POLICY = ThrottlePolicy("nav", rate=2, burst=4)
+GAME_POLICY = ThrottlePolicy("game", rate=1 / FLOOD_TIMING, burst=5)
+
+# Token bucket за один запит до Redis: поповнюємо, списуємо cost і повертаємо
+# {дозволено, треба попередити, скільки мс чекати}. Попереджаємо лише раз поспіль.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'warned')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+local warned = state[3] or '0'
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed, warn, wait_ms = 0, 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+    warned = '0'
+else
+    wait_ms = math.ceil((cost - tokens) / rate * 1000)
+    if warned ~= '1' then
+        warn = 1
+        warned = '1'
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'warned', warned)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, warn, wait_ms}
+"""
+
+# Політика береться з прапорця обробника flags={"throttling": ...},
+# далі з router_policies для роутера, що обробляє подію, і нарешті default_policy.
 class ThrottlingMiddleware(BaseMiddleware):
-    def __init__(self, storage: RedisStorage):
+    def __init__(self, storage: RedisStorage, default_policy: ThrottlePolicy = DEFAULT_POLICY,
+                 router_policies: Optional[Dict[Router, ThrottlePolicy]] = None,
+                 local_cache_size: int = LOCAL_CACHE_SIZE):
         self.storage = storage
+        self.script = storage.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self.default_policy = default_policy
+        self.router_policies = router_policies or {}
+        # ключ відра -> момент (monotonic), до якого запит точно буде відхилено, не питаючи Redis
+        self.blocked_until = OrderedDict()
+        self.local_cache_size = local_cache_size
+
+    def _policy(self, data: Dict) -> ThrottlePolicy:
+        policy = get_flag(data, "throttling")
+        if policy is None:
+            policy = self.router_policies.get(data.get("event_router"), self.default_policy)
+        return policy
+
+    def _locally_blocked(self, key: str) -> bool:
+        until = self.blocked_until.get(key)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            self.blocked_until.move_to_end(key)
+            return True
+        del self.blocked_until[key]
+        return False
+
+    def _block_locally(self, key: str, seconds: float):
+        self.blocked_until[key] = time.monotonic() + seconds
+        self.blocked_until.move_to_end(key)
+        if len(self.blocked_until) > self.local_cache_size:
+            self.blocked_until.popitem(last=False)
+
+    async def _reject(self, event: TelegramObject, warn: bool, wait: float):
+        if isinstance(event, CallbackQuery):
+            # Відповідь на callback потрібна в будь-якому разі, щоб зник годинник на кнопці
+            return await event.answer("⏳ Не так швидко")
+        if warn:
+            return await event.answer(f'Не флуди. Почекай {max(1, round(wait))} секунд')
+
+    async def __call__(self, handler : Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],  event: TelegramObject, data: Dict) -> Any:
+        policy = self._policy(data)
+        key = f'throttle:{event.from_user.id}:{policy.bucket}'
+        local_key = f'{key}:{policy.cost}'
+        if self._locally_blocked(local_key):
+            metrics.throttled_total.inc(policy.bucket)
+            return await self._reject(event, warn=False, wait=0)
+
+        allowed, warn, wait_ms = await self.script(
+            keys=[key], args=[policy.burst, policy.rate, policy.cost, time.time()]
+        )
+        if not allowed:
+            metrics.throttled_total.inc(policy.bucket)
+            self._block_locally(local_key, wait_ms / 1000)
+            return await self._reject(event, warn=bool(warn), wait=wait_ms / 1000)
 
-    async def __call__(self, handler : Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],  event: Message, data: Dict) -> Any:
-        user = f'user{event.from_user.id}'
-        check_user = await self.storage.redis.get(name=user)
+        return await handler(event, data);
 
-        if check_user:
-            if int(check_user.decode()) == 1:
-                await self.storage.redis.set(name=user, value=0, ex=10)
-                return await event.answer('Не флуди. Почекай 10 секунд')
-            return 
-        await self.storage.redis.set(name=user, value=1, ex=FLOOD_TIMING)
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
 
-        return await handler(event, data);
\ No newline at end of file
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]], event: TelegramObject, data: Dict) -> Any:
+        async with self.semaphore:
+            return await handler(event, data)
\ No newline at end of file
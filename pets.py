@@ -0,0 +1,80 @@
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+STARTING_XP = 100
+
+
+# У більшості записів ті самі кілька дат, тож і об'єкти int для них спільні
+@lru_cache(maxsize=4096)
+def _ordinal(value) -> Optional[int]:
+    return date.fromisoformat(value).toordinal() if value else None
+
+def _iso(ordinal: Optional[int]) -> Optional[str]:
+    return date.fromordinal(ordinal).isoformat() if ordinal is not None else None
+
+def today_ordinal() -> int:
+    return date.today().toordinal()
+
+
+# Запис Ліцейчика в пам'яті. Дати зберігаються як порядкові номери днів
+# (date.toordinal()), тож порівняння й різниця в днях — звичайна арифметика.
+# На диску й у Redis лишається попередній JSON-формат з ISO-датами.
+class Pet:
+    __slots__ = ("xp", "alive", "last_fed", "last_quiz", "last_daily", "died_at", "extra")
+
+    def __init__(self, xp: int, alive: bool, last_fed: int, last_quiz: Optional[int] = None,
+                 last_daily: Optional[int] = None, died_at: Optional[int] = None, extra: Optional[dict] = None):
+        self.xp = xp
+        self.alive = alive
+        self.last_fed = last_fed
+        self.last_quiz = last_quiz
+        self.last_daily = last_daily
+        self.died_at = died_at
+        self.extra = extra  # невідомі поля зі старих записів, щоб не загубити їх при збереженні
+
+    @classmethod
+    def new(cls, day: int = None) -> "Pet":
+        day = day or today_ordinal()
+        return cls(STARTING_XP, True, day, None, day)
+
+    def copy(self) -> "Pet":
+        return Pet(self.xp, self.alive, self.last_fed, self.last_quiz, self.last_daily, self.died_at, self.extra)
+
+    def starve(self, day: int):
+        self.alive = False
+        self.died_at = day
+        self.xp = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Pet":
+        extra = None
+        if not _FIELDS.issuperset(data):
+            extra = {key: value for key, value in data.items() if key not in _FIELDS}
+        return cls(
+            data["xp"], data.get("alive", True), _ordinal(data["last_fed"]),
+            _ordinal(data.get("last_quiz")), _ordinal(data.get("last_daily")), _ordinal(data.get("died_at")), extra,
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            "xp": self.xp,
+            "alive": self.alive,
+            "last_fed": _iso(self.last_fed),
+            "last_quiz": _iso(self.last_quiz),
+            "last_daily": _iso(self.last_daily),
+        }
+        if self.died_at is not None:
+            data["died_at"] = _iso(self.died_at)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Pet) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Pet({self.to_dict()!r})"
+
+
+_FIELDS = frozenset(Pet.__slots__) - {"extra"}
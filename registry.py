@@ -0,0 +1,100 @@
+from config import ADMIN_USER_ID
+from storage import storage
+import state
+
+# Ролі й підписки тримаємо в множинах, щоб перевірки на кожне повідомлення були O(1).
+# На диску вони лишаються звичайними списками ID у відповідних датасетах.
+# У спільному режимі джерелом правди є множини в Redis, а воркери оновлюють
+# свої локальні копії через state.events.
+class Registry:
+    DATASETS = ("helpers", "authorized_liceychyk", "subscribers")
+
+    def __init__(self, storage, admin_id: int):
+        self.storage = storage
+        self.admin_id = admin_id
+        self.helpers = set(storage.load("helpers", []))
+        self.authorized = set(storage.load("authorized_liceychyk", []))
+        self.subscribers = set(storage.load("subscribers", []))
+        self.staff = self.helpers | {admin_id}
+        self.redis = None
+
+    def _members(self, dataset: str) -> set:
+        return {"helpers": self.helpers, "authorized_liceychyk": self.authorized, "subscribers": self.subscribers}[dataset]
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id == self.admin_id
+
+    def is_helper(self, user_id: int) -> bool:
+        return user_id in self.helpers
+
+    def is_staff(self, user_id: int) -> bool:
+        return user_id in self.staff
+
+    def is_authorized(self, user_id: int) -> bool:
+        return user_id in self.authorized
+
+    def is_subscribed(self, user_id: int) -> bool:
+        return user_id in self.subscribers
+
+    def _apply(self, dataset: str, user_id: int):
+        self._members(dataset).add(user_id)
+        if dataset == "helpers":
+            self.staff.add(user_id)
+
+    def _on_event(self, payload: str):
+        dataset, _, user_id = payload.partition(":")
+        self._apply(dataset, int(user_id))
+
+    def _on_removed(self, payload: str):
+        dataset, _, user_ids = payload.partition(":")
+        self._members(dataset).difference_update(int(user_id) for user_id in user_ids.split(","))
+
+    async def _add(self, dataset: str, user_id: int) -> bool:
+        if self.redis is not None:
+            added = bool(await self.redis.sadd(f"state:{dataset}", user_id))
+            if added:
+                await state.events.publish("registry", f"{dataset}:{user_id}")
+        else:
+            added = user_id not in self._members(dataset)
+        if added:
+            self._apply(dataset, user_id)
+            self.storage.append(dataset, user_id)
+        return added
+
+    async def add_helper(self, user_id: int) -> bool:
+        return await self._add("helpers", user_id)
+
+    async def authorize(self, user_id: int) -> bool:
+        return await self._add("authorized_liceychyk", user_id)
+
+    async def subscribe(self, user_id: int) -> bool:
+        if user_id in self.subscribers:
+            return False
+        return await self._add("subscribers", user_id)
+
+    async def unsubscribe_many(self, user_ids) -> int:
+        # Чати, куди більше не можна писати, прибираємо одним записом у сховище
+        removed = [user_id for user_id in set(user_ids) if user_id in self.subscribers]
+        if not removed:
+            return 0
+        if self.redis is not None:
+            await self.redis.srem("state:subscribers", *removed)
+            await state.events.publish("registry_removed", "subscribers:" + ",".join(map(str, removed)))
+        self.subscribers.difference_update(removed)
+        self.storage.remove_many("subscribers", removed)
+        return len(removed)
+
+    async def attach(self, redis):
+        # Об'єднуємо локальні списки з тими, що вже є в Redis, і далі слухаємо зміни інших воркерів
+        self.redis = redis
+        for dataset in self.DATASETS:
+            members = self._members(dataset)
+            if members:
+                await redis.sadd(f"state:{dataset}", *members)
+            for user_id in await redis.smembers(f"state:{dataset}"):
+                self._apply(dataset, int(user_id))
+        state.events.on("registry", self._on_event)
+        state.events.on("registry_removed", self._on_removed)
+
+
+registry = Registry(storage, ADMIN_USER_ID)
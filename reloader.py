@@ -0,0 +1,70 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+RELOAD_INTERVAL = getattr(config, "RELOAD_INTERVAL", 5.0)
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def file_signature(path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# Раз на RELOAD_INTERVAL перевіряє mtime файлів. Змінений файл читається в окремому
+# потоці й передається в on_change; якщо файл не парситься або on_change кидає
+# ValueError — зміну відхиляємо й лишаємо попередню версію.
+class FileWatcher:
+    def __init__(self, interval: float = RELOAD_INTERVAL, loader: Callable = read_json):
+        self.interval = interval
+        self.loader = loader
+        self.watches: Dict[str, Callable] = {}
+        self.signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.task = None
+
+    def watch(self, path: str, on_change: Callable):
+        self.watches[path] = on_change
+        self.signatures[path] = file_signature(path)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
+
+    async def check(self):
+        for path, on_change in list(self.watches.items()):
+            signature = file_signature(path)
+            if signature is None or signature == self.signatures.get(path):
+                continue
+            self.signatures[path] = signature
+            try:
+                data = await asyncio.to_thread(self.loader, path)
+                on_change(data)
+            except (ValueError, OSError) as e:
+                logger.error("Файл %s не перезавантажено, лишаю попередню версію: %s", path, e)
+                continue
+            logger.info("Файл %s перезавантажено", path)
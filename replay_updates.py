@@ -0,0 +1,61 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import aiohttp
+
+# Локальна перевірка webhook-режиму: надсилає записані апдейти (JSON-масив або
+# по одному JSON на рядок) на сервер бота так само, як це робить Telegram.
+#   python replay_updates.py updates.jsonl --url http://127.0.0.1:8080/webhook --secret XXX
+
+
+def read_updates(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+async def post_update(session, url, headers, update, timings, statuses):
+    started = time.perf_counter()
+    async with session.post(url, json=update, headers=headers) as response:
+        await response.read()
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+    timings.append(time.perf_counter() - started)
+
+
+async def replay(path, url, secret, concurrency):
+    updates = read_updates(path)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, statuses = [], {}
+
+    async def limited(session, update):
+        async with semaphore:
+            await post_update(session, url, headers, update, timings, statuses)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(limited(session, update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    print(f"Надіслано {len(updates)} апдейтів за {elapsed:.2f} с, статуси: {statuses}")
+    if timings:
+        print(f"Відповідь: p50 {timings[len(timings) // 2] * 1e3:.1f} мс, макс {timings[-1] * 1e3:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(replay(args.path, args.url, args.secret, args.concurrency))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import os
+import sys
+import csv
+from array import array
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+WEEKDAY_NAMES = ["понеділок", "вівторок", "середа", "четвер", "п’ятниця"]
+LESSON_TIMES = [
+    "8:00–8:45", "9:00–9:45", "10:00–10:45", "11:00–11:45",
+    "12:00–12:45", "13:00–13:45", "13:50–14:35", "14:50–15:35"
+]
+DAYS = len(WEEKDAY_NAMES)
+TIMETABLE_FORMAT = "timetable/1"
+EMPTY = 0
+
+
+def _minutes(text: str) -> int:
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+# Межі уроків у хвилинах від півночі, розібрані з LESSON_TIMES один раз при імпорті
+LESSON_BOUNDS = [tuple(_minutes(part) for part in slot.split("–")) for slot in LESSON_TIMES]
+LESSON_STARTS = [start for start, _ in LESSON_BOUNDS]
+
+def format_minutes(minute: int) -> str:
+    return f"{minute // 60}:{minute % 60:02d}"
+
+# Назви колонок у CSV/XLSX (перший рядок), українською або англійською
+COLUMNS = {
+    "class": ("клас", "class"),
+    "day": ("день", "day"),
+    "lesson": ("урок", "lesson"),
+    "subject": ("предмет", "subject"),
+    "teacher": ("вчитель", "teacher"),
+}
+
+
+def validate_schedule(schedule_data) -> None:
+    if not isinstance(schedule_data, dict):
+        raise ValueError("розклад має бути об'єктом {клас: {день: [уроки]}}")
+    for class_key, days in schedule_data.items():
+        if not isinstance(days, dict):
+            raise ValueError(f"клас {class_key}: очікується об'єкт {{день: [уроки]}}")
+        for weekday, lessons in days.items():
+            if not str(weekday).isdigit() or not isinstance(lessons, list):
+                raise ValueError(f"клас {class_key}, день {weekday}: очікується список уроків")
+            if not all(isinstance(subject, str) for subject in lessons):
+                raise ValueError(f"клас {class_key}, день {weekday}: уроки мають бути рядками")
+
+
+# Рядки таблиці з однаковим текстом зберігаються один раз; 0 — порожній запис
+class Interner:
+    def __init__(self, values: Iterable[str] = ("",)):
+        self.values = [sys.intern(value) for value in values]
+        self.index = {value: i for i, value in enumerate(self.values)}
+
+    def __call__(self, value: Optional[str]) -> int:
+        value = (value or "").strip()
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return i
+
+
+# Розклад усієї школи в компактному вигляді: таблиці предметів і вчителів та
+# масиви фіксованої ширини slots для кожного (клас, день). Номер предмета уроку
+# slot класу з індексом c у день d лежить у lessons[(c * DAYS + d) * slots + slot].
+# Тексти відповідей рендеряться при першому запиті й далі беруться з кешу.
+# upcoming[offset] — номер найближчого непорожнього уроку, починаючи з цього
+# (slots, якщо до кінця дня уроків немає), щоб «що далі» не шукати перебором.
+class Timetable:
+    def __init__(self, classes: List[str], subjects: List[str], teachers: List[str],
+                 slots: int, lessons: array, lesson_teachers: array):
+        if len(lessons) != len(classes) * DAYS * slots or len(lesson_teachers) != len(lessons):
+            raise ValueError("розмір масивів розкладу не відповідає кількості класів і уроків")
+        if max(lessons, default=EMPTY) >= len(subjects) or max(lesson_teachers, default=EMPTY) >= len(teachers):
+            raise ValueError("посилання на неіснуючий предмет або вчителя")
+        self.classes = [sys.intern(class_key) for class_key in classes]
+        self.class_index = {class_key: i for i, class_key in enumerate(self.classes)}
+        self.subjects = [sys.intern(subject) for subject in subjects]
+        self.teachers = [sys.intern(teacher) for teacher in teachers]
+        self.slots = slots
+        self.lessons = lessons
+        self.lesson_teachers = lesson_teachers
+        self.rendered: Dict[Tuple[str, int], Optional[Tuple[str, str]]] = {}
+        self.upcoming = array("H", lessons)
+        for start in range(0, len(lessons), slots):
+            following = slots
+            for offset in range(start + slots - 1, start - 1, -1):
+                if lessons[offset] != EMPTY:
+                    following = offset - start
+                self.upcoming[offset] = following
+
+    def __contains__(self, class_key: str) -> bool:
+        return class_key in self.class_index
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def day(self, class_key: str, weekday: int) -> List[Tuple[int, str, str]]:
+        # [(номер уроку з 0, предмет, вчитель)] без порожніх уроків
+        i = self.class_index.get(class_key)
+        if i is None or not 0 <= weekday < DAYS:
+            return []
+        start = (i * DAYS + weekday) * self.slots
+        return [
+            (slot, self.subjects[subject], self.teachers[self.lesson_teachers[start + slot]])
+            for slot, subject in enumerate(self.lessons[start:start + self.slots])
+            if subject != EMPTY
+        ]
+
+    def _lesson(self, start: int, slot: int) -> Tuple[int, str, str]:
+        return slot, self.subjects[self.lessons[start + slot]], self.teachers[self.lesson_teachers[start + slot]]
+
+    def at(self, class_key: str, weekday: int, minute: int):
+        # (поточний урок або None, наступний урок або None) для хвилини дня;
+        # None, якщо цього дня в класу уроків немає
+        i = self.class_index.get(class_key)
+        if i is None or not 0 <= weekday < DAYS:
+            return None
+        start = (i * DAYS + weekday) * self.slots
+        if self.upcoming[start] == self.slots:
+            return None
+        slots = min(self.slots, len(LESSON_BOUNDS))
+        slot = bisect_right(LESSON_STARTS, minute) - 1  # останній урок, що вже почався
+        current = None
+        if 0 <= slot < slots and minute < LESSON_BOUNDS[slot][1] and self.lessons[start + slot] != EMPTY:
+            current = self._lesson(start, slot)
+        following = self.upcoming[start + slot + 1] if slot + 1 < slots else self.slots
+        return current, self._lesson(start, following) if following < slots else None
+
+    def _compile(self, class_key: str, weekday: int) -> Optional[Tuple[str, str]]:
+        lessons = self.day(class_key, weekday)
+        if not lessons:
+            return None
+        last = lessons[-1][0]
+        by_slot = {slot: (subject, teacher) for slot, subject, teacher in lessons}
+        text = ""
+        for slot in range(last + 1):
+            time_slot = LESSON_TIMES[slot] if slot < len(LESSON_TIMES) else "???"
+            subject, teacher = by_slot.get(slot, ("вікно", ""))
+            text += f"{slot + 1}. {time_slot} — {subject}" + (f" ({teacher})" if teacher else "") + "\n"
+        day_name = WEEKDAY_NAMES[weekday].capitalize()
+        return f"📅 Розклад для {class_key} на {day_name} (", f"):\n\n{text}"
+
+    def render(self, class_key: str, target_date: date) -> Optional[str]:
+        key = (class_key, target_date.weekday())
+        if key not in self.rendered:
+            self.rendered[key] = self._compile(*key)
+        entry = self.rendered[key]
+        if entry is None:
+            return None
+        head, body = entry
+        return f"{head}{target_date.strftime('%d.%m.%Y')}{body}"
+
+    def render_now(self, class_key: str, weekday: int, minute: int) -> Optional[str]:
+        lessons = self.at(class_key, weekday, minute)
+        if lessons is None:
+            return None
+        current, following = lessons
+        text = f"🕒 {class_key}, {format_minutes(minute)}\n\n"
+        if current is not None:
+            slot, subject, teacher = current
+            text += f"▶️ Зараз: {slot + 1}. {subject}" + (f" ({teacher})" if teacher else "")
+            text += f" — до {format_minutes(LESSON_BOUNDS[slot][1])}\n"
+        elif following is None:
+            text += "🏁 Уроки на сьогодні закінчились.\n"
+        elif following[0] == self.upcoming[(self.class_index[class_key] * DAYS + weekday) * self.slots]:
+            text += "🌅 Уроки ще не почались.\n"
+        elif minute < LESSON_BOUNDS[following[0] - 1][1]:
+            text += "🪟 Зараз вікно.\n"
+        else:
+            text += "☕ Зараз перерва.\n"
+        if following is not None:
+            slot, subject, teacher = following
+            text += f"⏭ Далі: {slot + 1}. {subject}" + (f" ({teacher})" if teacher else "")
+            text += f" — о {format_minutes(LESSON_BOUNDS[slot][0])}\n"
+        return text
+
+    def to_dict(self) -> dict:
+        return {
+            "format": TIMETABLE_FORMAT,
+            "slots": self.slots,
+            "classes": self.classes,
+            "subjects": self.subjects,
+            "teachers": self.teachers,
+            "lessons": self.lessons.tolist(),
+            "lesson_teachers": self.lesson_teachers.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data) -> "Timetable":
+        if not isinstance(data, dict) or data.get("format") != TIMETABLE_FORMAT:
+            raise ValueError(f"очікується скомпільований розклад формату {TIMETABLE_FORMAT}")
+        try:
+            return cls(
+                data["classes"], data["subjects"], data["teachers"], int(data["slots"]),
+                array("H", data["lessons"]), array("H", data["lesson_teachers"]),
+            )
+        except (KeyError, TypeError, OverflowError) as e:
+            raise ValueError(f"пошкоджений скомпільований розклад: {e}") from e
+
+    @classmethod
+    def from_schedule(cls, schedule_data: dict) -> "Timetable":
+        # Старий формат schedule.json: {клас: {день: [предмети]}}
+        validate_schedule(schedule_data)
+        classes = sorted(schedule_data)
+        slots = max([len(LESSON_TIMES), *(len(lessons) for days in schedule_data.values() for lessons in days.values())])
+        subjects = Interner()
+        lessons = array("H", bytes(2 * len(classes) * DAYS * slots))
+        for i, class_key in enumerate(classes):
+            for weekday, day_lessons in schedule_data[class_key].items():
+                weekday = int(weekday)
+                if weekday >= DAYS:
+                    continue
+                start = (i * DAYS + weekday) * slots
+                for slot, subject in enumerate(day_lessons):
+                    lessons[start + slot] = subjects(subject)
+        return cls(classes, subjects.values, [""], slots, lessons, array("H", bytes(len(lessons) * 2)))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "Timetable":
+        # Один прохід по рядках (клас, день, урок, предмет, вчитель); клас і день
+        # можуть іти в будь-якому порядку, тож уроки збираються в словник
+        slots = len(LESSON_TIMES)
+        subjects, teachers = Interner(), Interner()
+        cells: Dict[Tuple[str, int, int], Tuple[int, int]] = {}
+        for line, (class_key, day, lesson, subject, teacher) in enumerate(rows, start=2):
+            class_key = str(class_key or "").strip()
+            if not class_key:
+                continue
+            weekday = parse_weekday(day, line)
+            try:
+                slot = int(lesson) - 1
+            except (TypeError, ValueError):
+                raise ValueError(f"рядок {line}: номер уроку має бути числом, а не {lesson!r}") from None
+            if not 0 <= slot < slots:
+                raise ValueError(f"рядок {line}: урок {slot + 1}, а дзвінків лише {slots}")
+            if not str(subject or "").strip():
+                raise ValueError(f"рядок {line}: не вказано предмет")
+            if (class_key, weekday, slot) in cells:
+                raise ValueError(f"рядок {line}: у {class_key} вже є {slot + 1}-й урок у {WEEKDAY_NAMES[weekday]}")
+            cells[(class_key, weekday, slot)] = (subjects(str(subject)), teachers(str(teacher or "")))
+        classes = sorted({class_key for class_key, _, _ in cells})
+        index = {class_key: i for i, class_key in enumerate(classes)}
+        lessons = array("H", bytes(2 * len(classes) * DAYS * slots))
+        lesson_teachers = array("H", bytes(len(lessons) * 2))
+        for (class_key, weekday, slot), (subject, teacher) in cells.items():
+            offset = (index[class_key] * DAYS + weekday) * slots + slot
+            lessons[offset] = subject
+            lesson_teachers[offset] = teacher
+        return cls(classes, subjects.values, teachers.values, slots, lessons, lesson_teachers)
+
+
+def parse_weekday(value, line: int) -> int:
+    text = str(value or "").strip().lower().replace("'", "’")
+    if text.isdigit() and 1 <= int(text) <= DAYS:
+        return int(text) - 1
+    if text in WEEKDAY_NAMES:
+        return WEEKDAY_NAMES.index(text)
+    raise ValueError(f"рядок {line}: невідомий день {value!r} (1–{DAYS} або назва)")
+
+def _select_columns(rows):
+    header = [str(cell or "").strip().lower() for cell in next(rows, [])]
+    positions = []
+    for name, aliases in COLUMNS.items():
+        position = next((i for i, cell in enumerate(header) if cell in aliases), None)
+        if position is None and name != "teacher":
+            raise ValueError(f"у першому рядку немає колонки «{aliases[0]}»")
+        positions.append(position)
+    for row in rows:
+        yield tuple(row[i] if i is not None and i < len(row) else None for i in positions)
+
+def read_rows(path: str):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from _select_columns(csv.reader(f))
+    elif ext == ".xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise SystemExit("Для імпорту XLSX потрібен openpyxl: pip install openpyxl") from None
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from _select_columns(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"непідтримуваний формат {ext}: потрібен .csv або .xlsx")
+
+
+
+def import_timetable(source: str, target: str):
+    from storage import DATA_DIR, save_json
+    timetable = Timetable.from_rows(read_rows(source))
+    target = target or os.path.join(DATA_DIR, "timetable.json")
+    # Файл підміняється атомарно, тож бот підхопить або старий, або новий розклад цілком
+    written = save_json(target, timetable.to_dict(), indent=None)
+    print(f"✅ {target}: {len(timetable)} класів, {len(timetable.subjects) - 1} предметів, "
+          f"{len(timetable.teachers) - 1} вчителів, {written} байт")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "import":
+        try:
+            import_timetable(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}")
+    else:
+        print("Використання: python schedule.py import розклад.csv|розклад.xlsx [data/timetable.json]")
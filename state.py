@@ -0,0 +1,338 @@
+import json
+import asyncio
+import inspect
+import logging
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+import config
+from storage import storage, SqliteStorage
+from pets import Pet
+
+logger = logging.getLogger(__name__)
+
+# Спільний стан для кількох воркерів. Без SHARED_STATE усе лежить у пам'яті процесу
+# і в storage, як раніше; з ним — записи Ліцейчиків, очікувані підтвердження й
+# лічильники переносяться в Redis, а воркери повідомляють одне одного про зміни
+# через pub/sub.
+SHARED_STATE = getattr(config, "SHARED_STATE", False)
+PETS_DATASET = "tamagotchi"
+PENDING_TTL = 3600
+EVENTS_CHANNEL = "state:events"
+
+# Змінює запис лише якщо Ліцейчик досі живий і голодний. Дати тут — ISO-рядки
+# збереженого JSON, тож Lua порівнює їх як рядки — щоб не затерти годування,
+# яке сталося між читанням і записом.
+STARVE_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then return 0 end
+local pet = cjson.decode(raw)
+if pet['alive'] == true and pet['last_fed'] <= ARGV[1] then
+    pet['alive'] = false
+    pet['died_at'] = ARGV[2]
+    pet['xp'] = 0
+    redis.call('SET', KEYS[1], cjson.encode(pet))
+    return 1
+end
+return 0
+"""
+
+ALLOCATE_ID_SCRIPT = """
+local value = redis.call('INCR', KEYS[1])
+local floor = tonumber(ARGV[1])
+if value <= floor then
+    value = floor + 1
+    redis.call('SET', KEYS[1], value)
+end
+return value
+"""
+
+
+def _dump(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+# Слухачі змін досвіду: listener(uid, xp), де xp = None, якщо Ліцейчик мертвий
+# або видалений. У спільному режимі зміни приходять від усіх воркерів через events.
+pet_listeners: List[Callable[[int, Optional[int]], None]] = []
+
+def _score(pet: Optional[Pet]) -> Optional[int]:
+    return pet.xp if pet is not None and pet.alive else None
+
+def _notify(uid: int, xp: Optional[int]):
+    for listener in pet_listeners:
+        listener(uid, xp)
+
+
+# Записи — pets.Pet під цілим user ID. update(uid, fn): fn отримує копію запису
+# й повертає новий запис або None, якщо нічого змінювати не треба.
+# У Redis fn може викликатися кілька разів.
+class LocalPetStore:
+    def __init__(self, storage):
+        self.storage = storage
+        storage.register_codec(PETS_DATASET, Pet.from_dict, Pet.to_dict, key=int)
+        self.records: Dict[int, Pet] = storage.load(PETS_DATASET, {})
+
+    async def get(self, uid: int) -> Optional[Pet]:
+        pet = self.records.get(uid)
+        return pet.copy() if pet is not None else None
+
+    async def put(self, uid: int, pet: Pet):
+        self.storage.put(PETS_DATASET, uid, pet)
+        _notify(uid, _score(pet))
+
+    async def create(self, uid: int, pet: Pet) -> bool:
+        if uid in self.records:
+            return False
+        await self.put(uid, pet)
+        return True
+
+    async def delete(self, uid: int) -> bool:
+        if uid not in self.records:
+            return False
+        self.storage.delete(PETS_DATASET, uid)
+        _notify(uid, None)
+        return True
+
+    async def scores(self) -> List[Tuple[int, Optional[int]]]:
+        return [(uid, _score(pet)) for uid, pet in self.records.items()]
+
+    async def update(self, uid: int, fn: Callable[[Pet], Optional[Pet]]) -> Optional[Pet]:
+        pet = await self.get(uid)
+        if pet is None:
+            return None
+        pet = fn(pet)
+        if pet is not None:
+            await self.put(uid, pet)
+        return pet
+
+    async def sweep_hunger(self, cutoff: int, died_at: int) -> int:
+        starved = {}
+        for uid, pet in self.records.items():
+            if pet.alive and pet.last_fed <= cutoff:
+                pet = pet.copy()
+                pet.starve(died_at)
+                starved[uid] = pet
+        if starved:
+            self.storage.put_many(PETS_DATASET, starved)
+            for uid in starved:
+                _notify(uid, None)
+        return len(starved)
+
+
+class RedisPetStore:
+    INDEX = "state:pets"
+    CHUNK = 500
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.starve = redis.register_script(STARVE_SCRIPT)
+
+    @staticmethod
+    def _key(uid: int) -> str:
+        return f"state:pet:{uid}"
+
+    async def seed(self, records: Dict[int, Pet]):
+        # Перший запуск у спільному режимі: переносимо локальні записи, якщо в Redis їх ще немає
+        if not records or await self.redis.scard(self.INDEX):
+            return
+        uids = list(records)
+        for start in range(0, len(uids), self.CHUNK):
+            chunk = uids[start:start + self.CHUNK]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for uid in chunk:
+                    pipe.set(self._key(uid), _dump(records[uid].to_dict()), nx=True)
+                pipe.sadd(self.INDEX, *chunk)
+                await pipe.execute()
+        logger.info("Перенесено %s Ліцейчиків у Redis", len(uids))
+
+    async def get(self, uid: int) -> Optional[Pet]:
+        raw = await self.redis.get(self._key(uid))
+        return Pet.from_dict(json.loads(raw)) if raw is not None else None
+
+    @staticmethod
+    async def _publish(uid: int, xp: Optional[int]):
+        await events.publish("pet", f"{uid}:{'' if xp is None else xp}")
+
+    async def put(self, uid: int, pet: Pet):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(uid), _dump(pet.to_dict()))
+            pipe.sadd(self.INDEX, uid)
+            await pipe.execute()
+        await self._publish(uid, _score(pet))
+
+    async def create(self, uid: int, pet: Pet) -> bool:
+        if not await self.redis.set(self._key(uid), _dump(pet.to_dict()), nx=True):
+            return False
+        await self.redis.sadd(self.INDEX, uid)
+        await self._publish(uid, _score(pet))
+        return True
+
+    async def delete(self, uid: int) -> bool:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(uid))
+            pipe.srem(self.INDEX, uid)
+            deleted, _ = await pipe.execute()
+        if deleted:
+            await self._publish(uid, None)
+        return bool(deleted)
+
+    async def _records(self):
+        uids = [int(uid) for uid in await self.redis.smembers(self.INDEX)]
+        for start in range(0, len(uids), self.CHUNK):
+            chunk = uids[start:start + self.CHUNK]
+            for uid, raw in zip(chunk, await self.redis.mget([self._key(uid) for uid in chunk])):
+                if raw is not None:
+                    yield uid, json.loads(raw)
+
+    async def scores(self) -> List[Tuple[int, Optional[int]]]:
+        return [(uid, data["xp"] if data.get("alive", True) else None) async for uid, data in self._records()]
+
+    async def update(self, uid: int, fn: Callable[[Pet], Optional[Pet]]) -> Optional[Pet]:
+        key = self._key(uid)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        return None
+                    pet = fn(Pet.from_dict(json.loads(raw)))
+                    if pet is None:
+                        return None
+                    pipe.multi()
+                    pipe.set(key, _dump(pet.to_dict()))
+                    await pipe.execute()
+                    await self._publish(uid, _score(pet))
+                    return pet
+                except WatchError:
+                    continue
+
+    async def sweep_hunger(self, cutoff: int, died_at: int) -> int:
+        # Кандидатів відбираємо прямо за JSON: ISO-дати порівнюються як рядки
+        cutoff_iso, died_at_iso = date.fromordinal(cutoff).isoformat(), date.fromordinal(died_at).isoformat()
+        candidates = [
+            uid async for uid, data in self._records()
+            if data.get("alive", True) and data["last_fed"] <= cutoff_iso
+        ]
+        if not candidates:
+            return 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for uid in candidates:
+                await self.starve(keys=[self._key(uid)], args=[cutoff_iso, died_at_iso], client=pipe)
+            results = await pipe.execute()
+        for uid, starved in zip(candidates, results):
+            if starved:
+                await self._publish(uid, None)
+        return sum(results)
+
+
+class LocalPending:
+    def __init__(self):
+        self.items = {}
+
+    async def set(self, user_id: int, text: str):
+        self.items[user_id] = text
+
+    async def pop(self, user_id: int) -> Optional[str]:
+        return self.items.pop(user_id, None)
+
+
+class RedisPending:
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def set(self, user_id: int, text: str):
+        await self.redis.set(f"state:pending_announce:{user_id}", text, ex=PENDING_TTL)
+
+    async def pop(self, user_id: int) -> Optional[str]:
+        text = await self.redis.getdel(f"state:pending_announce:{user_id}")
+        return text.decode() if isinstance(text, bytes) else text
+
+
+# Повідомлення "тема дані" між воркерами. Обробники мають бути ідемпотентними:
+# воркер отримує й власні повідомлення.
+class EventBus:
+    def __init__(self):
+        self.handlers: Dict[str, Callable[[str], None]] = {}
+        self.redis = None
+        self.task = None
+
+    def on(self, topic: str, handler: Callable[[str], None]):
+        self.handlers[topic] = handler
+
+    async def publish(self, topic: str, payload: str = ""):
+        if self.redis is not None:
+            await self.redis.publish(EVENTS_CHANNEL, f"{topic} {payload}")
+
+    async def start(self, redis: Redis):
+        self.redis = redis
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(EVENTS_CHANNEL)
+        self.task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            data = message["data"]
+            topic, _, payload = (data.decode() if isinstance(data, bytes) else data).partition(" ")
+            handler = self.handlers.get(topic)
+            if handler is None:
+                continue
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Помилка обробки події %s", topic)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+
+pets = LocalPetStore(storage)
+pending = LocalPending()
+events = EventBus()
+redis = None
+allocate_script = None
+
+
+async def allocate_id(name: str, floor: int) -> int:
+    if redis is None:
+        return floor + 1
+    return int(await allocate_script(keys=[f"state:next_id:{name}"], args=[floor]))
+
+async def run_once(name: str, ttl: int) -> bool:
+    # Щоб щоденні задачі в спільному режимі виконував лише один воркер
+    if redis is None:
+        return True
+    return bool(await redis.set(f"state:once:{name}", 1, nx=True, ex=ttl))
+
+def once_daily(name: str, job: Callable) -> Callable:
+    async def run():
+        if not await run_once(f"{name}:{date.today()}", ttl=86400):
+            return
+        result = job()
+        if inspect.isawaitable(result):
+            await result
+    run.__name__ = name
+    return run
+
+def _on_pet_event(payload: str):
+    uid, _, xp = payload.partition(":")
+    _notify(int(uid), int(xp) if xp else None)
+
+async def enable_shared(client: Redis):
+    global pets, pending, redis, allocate_script
+    if not isinstance(storage, SqliteStorage):
+        raise RuntimeError("SHARED_STATE потребує STORAGE_BACKEND = 'sqlite': JSON-файли не можна ділити між воркерами")
+    redis = client
+    allocate_script = client.register_script(ALLOCATE_ID_SCRIPT)
+    redis_pets = RedisPetStore(client)
+    await redis_pets.seed(storage.load(PETS_DATASET, {}))
+    pets = redis_pets
+    pending = RedisPending(client)
+    events.on("pet", _on_pet_event)
+    await events.start(client)
@@ -0,0 +1,479 @@
+import os
+import sys
+import time
+import json
+import zlib
+import struct
+import asyncio
+import marshal
+import sqlite3
+import logging
+import tempfile
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "data"
+SQLITE_FILE = os.path.join(DATA_DIR, "bot.sqlite3")
+STORAGE_BACKEND = getattr(config, "STORAGE_BACKEND", "json")
+FLUSH_INTERVAL = getattr(config, "FLUSH_INTERVAL", 2.0)
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "snapshot.bin")
+SNAPSHOT_MAGIC = b"LYCSNAP1"
+
+# Статичні файли, які редагуються вручну і не переносяться в сховище
+STATIC_DATASETS = {"schedule", "timetable", "menu"}
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+
+def load_json(path, default):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    save_json(path, default)
+    return default
+
+def save_json(path, data, indent=2):
+    # Пишемо в тимчасовий файл поруч і атомарно підміняємо, щоб збій посеред запису не зіпсував дані
+    directory = os.path.dirname(path) or "."
+    separators = None if indent else (",", ":")
+    payload = json.dumps(data, ensure_ascii=False, indent=indent, separators=separators).encode("utf-8")
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(payload)
+
+
+# Бінарний знімок усіх датасетів JsonStorage: MAGIC, crc32 і marshal-дамп
+# {назва: ((mtime_ns, size) JSON-файлу, дані)}. Знімок пишеться при зупинці,
+# а при запуску датасет береться з нього, лише якщо JSON-файл відтоді не змінювався
+# (наприклад, його не правили вручну). Будь-яка невідповідність — читаємо JSON.
+# Штамп береться в момент, коли пам'ять і файл точно збігаються (після читання чи
+# запису), тож файл, змінений вручну під час роботи бота, у знімок не потрапить.
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def save_snapshot(path, datasets):
+    payload = marshal.dumps(datasets)
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".bin")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + struct.pack("<I", zlib.crc32(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(payload)
+
+def load_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return {}
+    header = len(SNAPSHOT_MAGIC) + 4
+    if raw[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or len(raw) < header:
+        logger.warning("Знімок %s має невідомий формат, читаємо JSON", path)
+        return {}
+    checksum, = struct.unpack("<I", raw[len(SNAPSHOT_MAGIC):header])
+    payload = memoryview(raw)[header:]
+    if zlib.crc32(payload) != checksum:
+        logger.warning("Знімок %s пошкоджено, читаємо JSON", path)
+        return {}
+    try:
+        return marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        logger.warning("Знімок %s не розібрано, читаємо JSON", path)
+        return {}
+
+
+# Датасет — це або dict (ключ -> запис), або list (упорядкований набір значень).
+# load() повертає живий об'єкт, а всі зміни мають іти через методи сховища,
+# щоб бекенд міг зберегти лише змінений запис.
+#
+# Для dict-датасетів можна зареєструвати кодек (до першого load): тоді в пам'яті
+# лежать об'єкти decode(запис) під ключами key(рядок), а на диск пишеться encode(об'єкт).
+#
+# JsonStorage пише відкладено: зміни лише позначають датасет "брудним", а фонова
+# задача раз на FLUSH_INTERVAL серіалізує його в окремому потоці.
+class JsonStorage:
+    def __init__(self, data_dir: str = DATA_DIR, flush_interval: float = FLUSH_INTERVAL,
+                 snapshot_path: str = None):
+        self.data_dir = data_dir
+        self.flush_interval = flush_interval
+        self.snapshot_path = snapshot_path or os.path.join(data_dir, os.path.basename(SNAPSHOT_FILE))
+        self.snapshot = None
+        self.datasets = {}
+        self.codecs = {}
+        self.dirty = set()
+        self.stamps = {}
+        self.flusher = None
+
+    def register_codec(self, name: str, decode, encode, key=str):
+        self.codecs[name] = (decode, encode, key)
+
+    def _encode(self, name: str, data):
+        # Датасет у вигляді, придатному для JSON і marshal
+        codec = self.codecs.get(name)
+        if codec is None:
+            return data
+        encode = codec[1]
+        return {str(key): encode(value) for key, value in data.items()}
+
+    def _encoded(self, name: str):
+        return self._encode(name, self.datasets[name])
+
+    def _write(self, name: str, data) -> int:
+        return save_json(self.path(name), self._encode(name, data))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.data_dir, f"{name}.json")
+
+    def load(self, name: str, default):
+        if name not in self.datasets:
+            if self.snapshot is None:
+                self.snapshot = load_snapshot(self.snapshot_path)
+            path = self.path(name)
+            entry = self.snapshot.pop(name, None)
+            if entry is not None and entry[0] == file_stamp(path):
+                data = entry[1]
+            else:
+                data = load_json(path, default)
+            self.stamps[name] = file_stamp(path)
+            codec = self.codecs.get(name)
+            if codec is not None:
+                decode, _, key_type = codec
+                data = {key_type(key): decode(value) for key, value in data.items()}
+            self.datasets[name] = data
+        return self.datasets[name]
+
+    def save(self, name: str):
+        if self.flusher is None:
+            save_json(self.path(name), self._encoded(name))
+            self.stamps[name] = file_stamp(self.path(name))
+        else:
+            self.dirty.add(name)
+
+    def replace(self, name: str, data):
+        self.datasets[name] = data
+        self.save(name)
+
+    def keys(self, name: str):
+        # JSON-файл не прочитати частково: keys() і get() завантажують увесь датасет
+        return list(self.load(name, {}).keys())
+
+    def get(self, name: str, key: str):
+        return self.load(name, {}).get(key)
+
+    def put(self, name: str, key: str, value):
+        self.datasets[name][key] = value
+        self.save(name)
+
+    def put_many(self, name: str, items: dict):
+        self.datasets[name].update(items)
+        self.save(name)
+
+    def delete(self, name: str, key: str):
+        self.datasets[name].pop(key, None)
+        self.save(name)
+
+    def delete_many(self, name: str, keys):
+        for key in keys:
+            self.datasets[name].pop(key, None)
+        self.save(name)
+
+    def refresh(self, name: str, key: str):
+        # JSON-файли не діляться між процесами, тож перечитувати нічого
+        pass
+
+    def append(self, name: str, item):
+        self.datasets[name].append(item)
+        self.save(name)
+
+    def remove(self, name: str, item):
+        self.datasets[name].remove(item)
+        self.save(name)
+
+    def remove_many(self, name: str, items):
+        items = set(items)
+        self.datasets[name][:] = [item for item in self.datasets[name] if item not in items]
+        self.save(name)
+
+    def pop(self, name: str, index: int):
+        item = self.datasets[name].pop(index)
+        self.save(name)
+        return item
+
+    def start(self):
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не вдалося зберегти дані")
+
+    async def flush(self):
+        while self.dirty:
+            name = self.dirty.pop()
+            # У циклі подій лише поверхнева копія, щоб потік не читав dict, який саме змінюється.
+            # Записи всередині не змінюються на місці (їх замінюють цілком), тож кодування
+            # й серіалізацію можна робити в потоці.
+            started = time.perf_counter()
+            data = self.datasets[name]
+            snapshot = dict(data) if isinstance(data, dict) else list(data)
+            try:
+                written = await asyncio.to_thread(self._write, name, snapshot)
+            except Exception:
+                self.dirty.add(name)
+                raise
+            self.stamps[name] = file_stamp(self.path(name))
+            metrics.storage_flush_seconds.observe(name, value=time.perf_counter() - started)
+            metrics.storage_flush_bytes.observe(name, value=written)
+
+    def write_snapshot(self) -> int:
+        # Викликати лише після flush. Невикористані в цьому запуску записи знімка лишаємо —
+        # їхні штампи перевірить наступний запуск
+        datasets = dict(self.snapshot or {})
+        for name in self.datasets:
+            stamp = file_stamp(self.path(name))
+            if name in self.dirty or stamp is None or stamp != self.stamps.get(name):
+                # Файл змінили повз сховище — при запуску має перемогти він
+                datasets.pop(name, None)
+                continue
+            datasets[name] = (stamp, self._encoded(name))
+        return save_snapshot(self.snapshot_path, datasets)
+
+    async def shutdown(self):
+        if self.flusher is not None:
+            self.flusher.cancel()
+            try:
+                await self.flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self.flusher = None
+        try:
+            self.write_snapshot()
+        except Exception:
+            logger.exception("Не вдалося записати знімок даних")
+
+
+class SqliteStorage:
+    def __init__(self, path: str = SQLITE_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "dataset TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (dataset, key)) WITHOUT ROWID"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, dataset TEXT NOT NULL, value TEXT NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS items_dataset ON items (dataset, value)")
+        self.datasets = {}
+        self.codecs = {}
+
+    def register_codec(self, name: str, decode, encode, key=str):
+        self.codecs[name] = (decode, encode, key)
+
+    @staticmethod
+    def _dump(value) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+    def _dump_record(self, name: str, value) -> str:
+        codec = self.codecs.get(name)
+        return self._dump(codec[1](value) if codec else value)
+
+    def _load_record(self, name: str, raw: str):
+        codec = self.codecs.get(name)
+        return codec[0](json.loads(raw)) if codec else json.loads(raw)
+
+    def load(self, name: str, default):
+        if name not in self.datasets:
+            if isinstance(default, dict):
+                rows = self.conn.execute("SELECT key, value FROM records WHERE dataset = ?", (name,))
+                key_type = self.codecs[name][2] if name in self.codecs else str
+                self.datasets[name] = {key_type(key): self._load_record(name, value) for key, value in rows}
+            else:
+                rows = self.conn.execute("SELECT value FROM items WHERE dataset = ? ORDER BY id", (name,))
+                self.datasets[name] = [json.loads(value) for value, in rows]
+        return self.datasets[name]
+
+    def replace(self, name: str, data):
+        with self.conn:
+            self.conn.execute("DELETE FROM records WHERE dataset = ?", (name,))
+            self.conn.execute("DELETE FROM items WHERE dataset = ?", (name,))
+            if isinstance(data, dict):
+                self.conn.executemany(
+                    "INSERT INTO records (dataset, key, value) VALUES (?, ?, ?)",
+                    ((name, str(key), self._dump_record(name, value)) for key, value in data.items())
+                )
+            else:
+                self.conn.executemany(
+                    "INSERT INTO items (dataset, value) VALUES (?, ?)",
+                    ((name, self._dump(item)) for item in data)
+                )
+        self.datasets[name] = data
+
+    # keys/get читають зі бази напряму, якщо датасет не завантажено в пам'ять цілком
+    def keys(self, name: str):
+        if name in self.datasets:
+            return list(self.datasets[name].keys())
+        return [key for key, in self.conn.execute("SELECT key FROM records WHERE dataset = ?", (name,))]
+
+    def get(self, name: str, key: str):
+        if name in self.datasets:
+            return self.datasets[name].get(key)
+        row = self.conn.execute("SELECT value FROM records WHERE dataset = ? AND key = ?", (name, str(key))).fetchone()
+        return self._load_record(name, row[0]) if row else None
+
+    def put(self, name: str, key: str, value):
+        if name in self.datasets:
+            self.datasets[name][key] = value
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO records (dataset, key, value) VALUES (?, ?, ?)",
+                (name, str(key), self._dump_record(name, value))
+            )
+
+    def put_many(self, name: str, items: dict):
+        if name in self.datasets:
+            self.datasets[name].update(items)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO records (dataset, key, value) VALUES (?, ?, ?)",
+                ((name, str(key), self._dump_record(name, value)) for key, value in items.items())
+            )
+
+    def delete(self, name: str, key: str):
+        if name in self.datasets:
+            self.datasets[name].pop(key, None)
+        with self.conn:
+            self.conn.execute("DELETE FROM records WHERE dataset = ? AND key = ?", (name, str(key)))
+
+    def delete_many(self, name: str, keys):
+        if name in self.datasets:
+            for key in keys:
+                self.datasets[name].pop(key, None)
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM records WHERE dataset = ? AND key = ?", ((name, str(key)) for key in keys)
+            )
+
+    def refresh(self, name: str, key: str):
+        # Запис змінив інший процес — оновлюємо його копію в завантаженому датасеті
+        if name not in self.datasets:
+            return
+        row = self.conn.execute("SELECT value FROM records WHERE dataset = ? AND key = ?", (name, str(key))).fetchone()
+        key = self.codecs[name][2](key) if name in self.codecs else key
+        if row is None:
+            self.datasets[name].pop(key, None)
+        else:
+            self.datasets[name][key] = self._load_record(name, row[0])
+
+    def append(self, name: str, item):
+        self.datasets[name].append(item)
+        with self.conn:
+            self.conn.execute("INSERT INTO items (dataset, value) VALUES (?, ?)", (name, self._dump(item)))
+
+    def remove(self, name: str, item):
+        self.datasets[name].remove(item)
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM items WHERE id = (SELECT id FROM items WHERE dataset = ? AND value = ? ORDER BY id LIMIT 1)",
+                (name, self._dump(item))
+            )
+
+    def remove_many(self, name: str, items):
+        items = set(items)
+        self.datasets[name][:] = [item for item in self.datasets[name] if item not in items]
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM items WHERE dataset = ? AND value = ?", ((name, self._dump(item)) for item in items)
+            )
+
+    def pop(self, name: str, index: int):
+        items = self.datasets[name]
+        if index < 0:
+            index += len(items)
+        item = items.pop(index)
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM items WHERE id = (SELECT id FROM items WHERE dataset = ? ORDER BY id LIMIT 1 OFFSET ?)",
+                (name, index)
+            )
+        return item
+
+    def start(self):
+        pass
+
+    async def shutdown(self):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+
+def create_storage(backend: str = STORAGE_BACKEND):
+    if backend == "sqlite":
+        return SqliteStorage()
+    if backend == "json":
+        return JsonStorage()
+    raise ValueError(f"Невідомий STORAGE_BACKEND: {backend}")
+
+
+def migrate_json_to_sqlite(data_dir: str = DATA_DIR, db_path: str = SQLITE_FILE):
+    target = SqliteStorage(db_path)
+    for filename in sorted(os.listdir(data_dir)):
+        name, ext = os.path.splitext(filename)
+        if ext != ".json" or name in STATIC_DATASETS:
+            continue
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        target.replace(name, data)
+        print(f"✅ {filename}: перенесено {len(data)} записів")
+    target.close()
+
+
+def build_snapshot(data_dir: str = DATA_DIR):
+    source = JsonStorage(data_dir)
+    for filename in sorted(os.listdir(data_dir)):
+        name, ext = os.path.splitext(filename)
+        if ext == ".json" and name not in STATIC_DATASETS:
+            source.datasets[name] = load_json(source.path(name), None)
+    written = source.write_snapshot()
+    print(f"✅ {source.snapshot_path}: {len(source.datasets)} датасетів, {written} байт")
+
+
+storage = create_storage()
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        migrate_json_to_sqlite()
+    elif sys.argv[1:] == ["snapshot"]:
+        build_snapshot()
+    else:
+        print("Використання: python storage.py migrate | snapshot")